@@ -3,16 +3,37 @@ from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException
+from selenium.common.exceptions import TimeoutException, WebDriverException, NoSuchElementException, \
+    StaleElementReferenceException
 from selenium.webdriver.chrome.service import Service
 
-import time
+from bs4 import BeautifulSoup
+import requests
+
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import atexit
+import os
+import queue
 import re
+import threading
 
 from logger import setup_logger
+from metrics import timed
 
 logger = setup_logger(__name__)
 
+BROWSER_POOL_SIZE = int(os.getenv('BROWSER_POOL_SIZE', '3'))
+PHOTO_LOAD_TIMEOUT = 10
+PAGE_LOAD_TIMEOUT = 30
+DRIVER_WAIT_POLL = 1
+# the page changed under the scraper, the browser itself is fine
+PAGE_ERRORS = (NoSuchElementException, StaleElementReferenceException)
+PHOTO_GALLERY_SELECTOR = '.photo-gallery__item.js-photo-main, .photo-gallery__item.js-photo-slave'
+STATIC_FETCH_TIMEOUT = 15
+
+_http_session = requests.Session()
+
 
 def normalize_phone_number(phone_number):
     digits = re.sub(r'\D', '', phone_number)
@@ -24,22 +45,134 @@ def normalize_phone_number(phone_number):
     return normalized
 
 
-def get_ad_details(item_url):
-    logger.info(f"Начало извлечения данных для объявления: {item_url}")
+def create_driver():
     chrome_options = Options()
 
     chrome_options.add_argument("--no-sandbox")
     chrome_options.add_argument("--headless")
     chrome_options.add_argument("--disable-dev-shm-usage")
     chrome_options.add_argument("--disable-gpu")
-    chrome_options.add_argument("--remote-debugging-port=9222")
+    chrome_options.add_argument("--remote-debugging-port=0")
 
     service = Service()
     driver = webdriver.Chrome(service=service, options=chrome_options)
-    driver.get(item_url)
-    logger.debug("WebDriver загрузил страницу")
+    driver.set_page_load_timeout(PAGE_LOAD_TIMEOUT)
+    return driver
+
+
+class BrowserPool:
+    def __init__(self, size=BROWSER_POOL_SIZE):
+        self.size = size
+        self._drivers = queue.Queue()
+        self._all_drivers = []
+        self._starting = 0
+        self._lock = threading.Lock()
+
+    def _reserve(self):
+        with self._lock:
+            if len(self._all_drivers) + self._starting >= self.size:
+                return False
+            self._starting += 1
+            return True
+
+    def _spawn_driver(self):
+        try:
+            driver = create_driver()
+        finally:
+            with self._lock:
+                self._starting -= 1
+        with self._lock:
+            self._all_drivers.append(driver)
+        logger.debug(f"Запущен WebDriver ({len(self._all_drivers)}/{self.size})")
+        return driver
+
+    def _warm_driver(self):
+        try:
+            self._drivers.put(self._spawn_driver())
+        except Exception as e:
+            logger.error(f"Ошибка при запуске WebDriver: {e}")
+
+    def warm_up(self):
+        """
+        Starts the missing browsers in background threads, so that Chrome startup
+        overlaps the ads list crawl instead of delaying the first scraped ads.
+        """
+        while self._reserve():
+            threading.Thread(target=self._warm_driver, daemon=True).start()
+
+    def acquire(self):
+        while True:
+            try:
+                return self._drivers.get_nowait()
+            except queue.Empty:
+                pass
+            if self._reserve():
+                return self._spawn_driver()
+            # a browser may be starting in the background or fail to start
+            try:
+                return self._drivers.get(timeout=DRIVER_WAIT_POLL)
+            except queue.Empty:
+                continue
+
+    def release(self, driver, broken=False):
+        if broken:
+            self._discard(driver)
+            return
+        self._drivers.put(driver)
+
+    def _discard(self, driver):
+        with self._lock:
+            if driver in self._all_drivers:
+                self._all_drivers.remove(driver)
+        try:
+            driver.quit()
+        except Exception as e:
+            logger.error(f"Ошибка при закрытии WebDriver: {e}")
+
+    @contextmanager
+    def driver(self):
+        driver = self.acquire()
+        broken = False
+        try:
+            yield driver
+        except WebDriverException:
+            broken = True
+            raise
+        finally:
+            self.release(driver, broken=broken)
+
+    def close(self):
+        with self._lock:
+            drivers, self._all_drivers = self._all_drivers, []
+        for driver in drivers:
+            try:
+                driver.quit()
+            except Exception as e:
+                logger.error(f"Ошибка при закрытии WebDriver: {e}")
+        self._drivers = queue.Queue()
+        logger.debug("Все WebDriver пула закрыты")
+
+
+_browser_pool = None
+
+
+def get_browser_pool():
+    global _browser_pool
+    if _browser_pool is None:
+        _browser_pool = BrowserPool()
+        atexit.register(_browser_pool.close)
+    return _browser_pool
+
+
+def gallery_loaded(driver):
+    photo_elements = driver.find_elements(By.CSS_SELECTOR, PHOTO_GALLERY_SELECTOR)
+    if len(photo_elements) > 1 and all(photo.get_attribute('src') for photo in photo_elements):
+        return photo_elements
+    return False
 
-    ad_details = {
+
+def empty_ad_details(item_url):
+    return {
         'image_urls': [],
         'phone_number': '',
         'additional_info': {},
@@ -47,6 +180,80 @@ def get_ad_details(item_url):
         'ad_id': item_url.split("/")[-1],
     }
 
+
+def get_ad_details(item_url, pool=None):
+    with timed('detail_scrape'):
+        return _get_ad_details(item_url, pool)
+
+
+def _get_ad_details(item_url, pool=None):
+    ad_details = fetch_static_ad_details(item_url)
+    if ad_details is not None:
+        return ad_details
+
+    pool = pool or get_browser_pool()
+    try:
+        with pool.driver() as driver:
+            ad_details = scrape_ad_details(driver, item_url)
+    except WebDriverException as e:
+        logger.error(f"Ошибка WebDriver при загрузке объявления {item_url}: {e}")
+        ad_details = empty_ad_details(item_url)
+    ad_details['source'] = 'browser'
+    return ad_details
+
+
+def fetch_static_ad_details(item_url):
+    try:
+        response = _http_session.get(item_url, timeout=STATIC_FETCH_TIMEOUT)
+    except requests.RequestException as e:
+        logger.warning(f"Ошибка при получении страницы объявления {item_url}: {e}")
+        return None
+    if response.status_code != 200:
+        logger.warning(f"Ошибка HTTP {response.status_code} при получении страницы объявления {item_url}")
+        return None
+
+    ad_details = parse_static_ad_details(response.text, item_url)
+    if ad_details is None:
+        logger.info(f"Галерея не найдена в HTML объявления {item_url}, используем браузер")
+    return ad_details
+
+
+def parse_static_ad_details(html, item_url):
+    soup = BeautifulSoup(html, 'html.parser')
+    photo_elements = soup.select(PHOTO_GALLERY_SELECTOR)
+    image_urls = [photo.get('src') or photo.get('data-src') for photo in photo_elements]
+    image_urls = [url for url in image_urls if url]
+    if not image_urls:
+        return None
+    if len(image_urls) > 1:
+        image_urls = image_urls[1:]
+
+    ad_details = empty_ad_details(item_url)
+    ad_details['image_urls'] = [url.replace('md', 'xl') for url in image_urls]
+    for prop in soup.select('.sale-properties .sale-property'):
+        name = prop.select_one('.sale-property-name')
+        value = prop.select_one('.sale-property-value')
+        if name is None or value is None:
+            continue
+        ad_details['additional_info'][name.get_text().replace(':', '').strip()] = value.get_text().strip()
+    ad_details['source'] = 'static'
+    logger.info(f"Извлечено {len(ad_details['image_urls'])} изображений из HTML объявления без браузера")
+    return ad_details
+
+
+def get_ads_details(item_urls, pool=None):
+    pool = pool or get_browser_pool()
+    with ThreadPoolExecutor(max_workers=pool.size) as executor:
+        return list(executor.map(lambda item_url: get_ad_details(item_url, pool), item_urls))
+
+
+def scrape_ad_details(driver, item_url):
+    logger.info(f"Начало извлечения данных для объявления: {item_url}")
+    driver.get(item_url)
+    logger.debug("WebDriver загрузил страницу")
+
+    ad_details = empty_ad_details(item_url)
+
     try:
         try:
             expand_photos_button = WebDriverWait(driver, 10).until(
@@ -54,12 +261,14 @@ def get_ad_details(item_url):
             )
             expand_photos_button.click()
             logger.info("Изображения успешно раскрыты")
-            time.sleep(5)
+            try:
+                WebDriverWait(driver, PHOTO_LOAD_TIMEOUT).until(gallery_loaded)
+            except TimeoutException:
+                logger.warning("Галерея не загрузилась полностью, извлекаем доступные изображения")
         except TimeoutException:
             logger.warning("Кнопка раскрытия изображений не найдена, извлекаем доступные изображения")
 
-        photo_elements = driver.find_elements(By.CSS_SELECTOR,
-                                              '.photo-gallery__item.js-photo-main, .photo-gallery__item.js-photo-slave')
+        photo_elements = driver.find_elements(By.CSS_SELECTOR, PHOTO_GALLERY_SELECTOR)
         if len(photo_elements) > 1:
             photo_elements = photo_elements[1:]
         ad_details['image_urls'] = [photo.get_attribute('src').replace('md', 'xl') for photo in photo_elements]
@@ -72,10 +281,12 @@ def get_ad_details(item_url):
             ad_details['additional_info'][name] = value
         logger.info("Детали объявления успешно извлечены")
 
+    except PAGE_ERRORS as e:
+        logger.error(f"Ошибка при извлечении данных объявления: {e}")
+    except WebDriverException:
+        # a dead or hung browser must not go back to the pool
+        raise
     except Exception as e:
         logger.error(f"Ошибка при извлечении данных объявления: {e}")
-    finally:
-        driver.quit()
-        logger.debug("WebDriver закрыт")
 
     return ad_details
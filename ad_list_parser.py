@@ -1,19 +1,20 @@
+import os
 import requests
 import json
+from concurrent.futures import ThreadPoolExecutor
 from bs4 import BeautifulSoup
 from logger import setup_logger
-from utils import get_phone_number
+from metrics import timed
+from db_worker import enqueue_ads, get_pending_ads, get_frontier_high_water_mark, get_known_ad_ids
 
 logger = setup_logger(__name__)
 
-
-def save_last_processed_ad(ad_id):
-    try:
-        with open('volume/last_processed_ad.json', 'w') as f:
-            json.dump({"last_processed_ad": ad_id}, f)
-        logger.info(f"Сохранено последнее обработанное объявление: {ad_id}")
-    except Exception as e:
-        logger.error(f"Ошибка при сохранении последнего обработанного объявления: {e}")
+ADS_LIST_URL = 'https://autokochka.ru/sales/?sort=newest&page={page}'
+MAX_CRAWL_PAGES = 20
+PAGE_FETCH_CONCURRENCY = 3
+# ads processed per cycle, the rest of the queue waits for the next cycles
+PENDING_ADS_BATCH_SIZE = 20
+CRAWL_STATE_FILE = 'volume/crawl_state.json'
 
 
 def load_last_processed_ad():
@@ -31,54 +32,159 @@ def load_last_processed_ad():
         return None
 
 
-def parse_ads_list(url='https://autokochka.ru/sales/?sort=newest&page=4'):
+def fetch_ads_page(page, url_template=ADS_LIST_URL):
+    url = url_template.format(page=page)
     logger.info(f"Начало парсинга списка объявлений с {url}")
-    last_processed_ad = load_last_processed_ad()
-    ads_list = []
-
-    response = requests.get(url)
-    if response.status_code == 200:
-        logger.info("Успешно получен ответ от сервера.")
-        soup = BeautifulSoup(response.text, 'html.parser')
-        sale_items = soup.find_all('div', class_='pure-g sale-item sale-block-item')
-
-        if not sale_items:
-            logger.warning("На странице не найдены объявления.")
-            return ads_list
-
-        for item in reversed(sale_items):
-            data_id = item['data-id']
-            if last_processed_ad and int(data_id) <= int(last_processed_ad):
-                logger.debug(f"Объявление {data_id} уже было обработано.")
-                continue
-
-            title_link = item.find('a', class_='sale-link')
-            title = title_link.text.strip()
-            item_url = 'https://autokochka.ru' + title_link['href']
-            chassis_info = item.find('div', class_='sale-chassis').text.strip()
-            city = item.find('div', class_='sale-city').text.strip()
-            price = item.find('div', class_='sale-price').text.strip()
-            phone_number = get_phone_number(data_id)
-
-            logger.debug(f"Найдено новое объявление: {title} с ID {data_id} и телефоном {phone_number}")
-
-            ads_list.append({
-                'data_id': data_id,
-                'title': title,
-                'item_url': item_url,
-                'chassis_info': chassis_info,
-                'price': price,
-                'city': city,
-                'phone_number': phone_number,
-            })
-
-        if ads_list:
-            logger.info(f"Найдено {len(ads_list)} новых объявлений.")
-            save_last_processed_ad(ads_list[-1]['data_id'])
-        else:
-            logger.info("Новых объявлений не найдено.")
-    else:
+    try:
+        with timed('list_fetch'):
+            response = requests.get(url)
+    except requests.RequestException as e:
+        logger.error(f"Ошибка при получении страницы {url}: {e}")
+        return None
+    if response.status_code != 200:
         logger.error(f"Ошибка при получении страницы {url} с кодом ответа HTTP {response.status_code}")
+        return None
+    logger.info("Успешно получен ответ от сервера.")
+    return parse_ads_page(response.text)
+
+
+def parse_ads_page(html):
+    soup = BeautifulSoup(html, 'html.parser')
+    sale_items = soup.find_all('div', class_='pure-g sale-item sale-block-item')
+    if not sale_items:
+        logger.warning("На странице не найдены объявления.")
+
+    ads = []
+    for item in sale_items:
+        title_link = item.find('a', class_='sale-link')
+        ads.append({
+            'data_id': item['data-id'],
+            'title': title_link.text.strip(),
+            'item_url': 'https://autokochka.ru' + title_link['href'],
+            'chassis_info': item.find('div', class_='sale-chassis').text.strip(),
+            'price': item.find('div', class_='sale-price').text.strip(),
+            'city': item.find('div', class_='sale-city').text.strip(),
+        })
+    return ads
+
+
+def load_crawl_state():
+    try:
+        with open(CRAWL_STATE_FILE, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.error(f"Ошибка при загрузке состояния обхода списка объявлений: {e}")
+        return None
 
-    return ads_list
 
+def save_crawl_state(state):
+    if state is None:
+        if os.path.exists(CRAWL_STATE_FILE):
+            os.remove(CRAWL_STATE_FILE)
+        return
+    with open(CRAWL_STATE_FILE, 'w') as f:
+        json.dump(state, f)
+
+
+def crawl_pages(executor, url_template, first_page, last_page, lower_bound, filling_gap, concurrency):
+    """
+    Returns ads above lower_bound that are not in the frontier yet, whether the walk
+    reached already processed ads, and the page that could not be fetched.
+    """
+    discovered = {}
+    page = first_page
+    reached_seen = False
+    failed_page = None
+    while page <= last_page and not reached_seen and failed_page is None:
+        pages = list(range(page, min(page + concurrency, last_page + 1)))
+        for current_page, page_ads in zip(pages, executor.map(lambda p: fetch_ads_page(p, url_template), pages)):
+            if page_ads is None:
+                failed_page = current_page
+                break
+            if not page_ads:
+                reached_seen = True
+                break
+            known_ids = get_known_ad_ids([ad['data_id'] for ad in page_ads])
+            for ad in page_ads:
+                if lower_bound and int(ad['data_id']) <= int(lower_bound):
+                    logger.debug(f"Объявление {ad['data_id']} уже было обработано.")
+                    reached_seen = True
+                    continue
+                if ad['data_id'] in known_ids:
+                    # while a gap is being filled known ads above the lower bound are expected
+                    reached_seen = reached_seen or not filling_gap
+                    continue
+                discovered.setdefault(ad['data_id'], ad)
+            if reached_seen:
+                break
+        page += len(pages)
+    return discovered, reached_seen, failed_page
+
+
+def crawl_new_ads(url_template=ADS_LIST_URL, max_pages=MAX_CRAWL_PAGES, concurrency=PAGE_FETCH_CONCURRENCY):
+    """
+    Walks list pages from the newest ads down to ads that are already known.
+    If a page fails or max_pages runs out first, the ads above the gap are still
+    enqueued, and the old lower bound and the page to resume from are saved in
+    CRAWL_STATE_FILE. The next cycles continue from that page, skipping known ads
+    until they reach the lower bound, because the frontier high water mark has
+    already moved past the gap. They also walk from the first page down to the high
+    water mark, so ads posted meanwhile don't wait for the gap to be filled.
+    """
+    state = load_crawl_state()
+    high_water_mark = get_frontier_high_water_mark()
+    if state:
+        lower_bound = state['lower_bound']
+        # deleted ads shift the list up, so start one page earlier
+        first_page = max(1, state['resume_page'] - 1)
+        logger.info(f"Продолжаем обход списка объявлений со страницы {first_page} до объявления {lower_bound}.")
+    else:
+        lower_bound = high_water_mark or load_last_processed_ad()
+        first_page = 1
+    last_page = first_page + max_pages - 1
+    if lower_bound is None:
+        logger.info("Очередь обработки пуста, обходим только первую страницу.")
+        last_page = first_page
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        discovered, reached_seen, failed_page = crawl_pages(executor, url_template, first_page, last_page,
+                                                            lower_bound, bool(state), concurrency)
+        if state and high_water_mark is not None:
+            fresh, reached_mark, _ = crawl_pages(executor, url_template, 1, max_pages, high_water_mark,
+                                                 False, concurrency)
+            if reached_mark:
+                discovered.update(fresh)
+            else:
+                # enqueueing them would move the high water mark over a second gap
+                discovered = {data_id: ad for data_id, ad in discovered.items()
+                              if int(data_id) <= int(high_water_mark)}
+                logger.warning(f"Новые объявления не обойдены до объявления {high_water_mark}, "
+                               f"повторим в следующем цикле.")
+
+    if reached_seen or lower_bound is None:
+        save_crawl_state(None)
+    else:
+        resume_page = failed_page or last_page + 1
+        if failed_page is None:
+            logger.warning(f"Обход остановлен на странице {last_page}, не дойдя до обработанных объявлений. "
+                           f"Продолжим со страницы {resume_page} в следующем цикле.")
+        else:
+            logger.warning(f"Страница {failed_page} не получена, продолжим с неё в следующем цикле.")
+        save_crawl_state({'lower_bound': str(lower_bound), 'resume_page': resume_page})
+
+    new_ads = sorted(discovered.values(), key=lambda ad: int(ad['data_id']))
+    for ad in new_ads:
+        logger.debug(f"Найдено новое объявление: {ad['title']} с ID {ad['data_id']}")
+    return enqueue_ads(new_ads)
+
+
+def parse_ads_list(url_template=ADS_LIST_URL):
+    crawl_new_ads(url_template)
+    ads_list = get_pending_ads(PENDING_ADS_BATCH_SIZE)
+    if ads_list:
+        logger.info(f"Найдено {len(ads_list)} новых объявлений.")
+    else:
+        logger.info("Новых объявлений не найдено.")
+    return ads_list
@@ -5,11 +5,15 @@ from fastapi import FastAPI, Response
 import uvicorn
 from telebot.async_telebot import AsyncTeleBot
 from telebot.types import ReplyKeyboardMarkup, KeyboardButton, Message
-from db_worker import Session, Advertisement, CarNumber, search_ads_by_number
+from db_worker import search_ads_by_number, search_ads_by_plate_prefix, search_ads_by_similar_number, \
+    get_ad_links_by_number, normalize_plate
 from keyboard_factory import KeyboardFactory
 from logger import setup_logger
+from metrics import registry as metrics_registry, timed
+from plate_search import plate_search_keys
+from search_cache import search_cache
 from state_manager import set_state, BotState, get_state
-from utils import is_valid_number, read_json, add_user_to_json, create_keyboard, write_json, format_ads_info
+from utils import plate_query, read_json, add_user_to_json, create_keyboard, write_json, format_ads_info
 from pathlib import Path
 
 
@@ -145,12 +149,28 @@ async def viewing_list_handler(message: Message):
 
 @bot.message_handler(func=lambda message: get_state(message.from_user.id) == BotState.AWAITING_NUMBER_INPUT)
 async def handle_number_input(message):
-    number = message.text.upper().replace(" ", "").replace("-", "")
+    query = normalize_plate(message.text)
+    number, search_kind = plate_query(query)
     markup = KeyboardFactory.return_keyboard()
-    if is_valid_number(number):
-        results = await search_ads_by_number(number)
-        if results:
-            formatted_ad = format_ads_info(results, ads_count=len(results))
+    if search_kind is not None:
+        formatted_ad = search_cache.get(query)
+        if formatted_ad is None:
+            tags = ()
+            if search_kind == 'prefix':
+                results = await search_ads_by_plate_prefix(number)
+            else:
+                tags = plate_search_keys(number)
+                results = await search_ads_by_number(number) if search_kind == 'exact' else []
+            if results:
+                formatted_ad = format_ads_info(results, ads_count=len(results))
+            elif search_kind != 'prefix':
+                results = await search_ads_by_similar_number(number)
+                if results:
+                    formatted_ad = "Точного совпадения нет, похожие номера:\n\n" + \
+                                   format_ads_info(results, ads_count=len(results))
+            formatted_ad = formatted_ad or ""
+            search_cache.set(query, formatted_ad, tags=tags)
+        if formatted_ad:
             await bot.send_message(message.chat.id, formatted_ad, reply_markup=markup, parse_mode='HTML')
             set_state(message.from_user.id, BotState.INITIAL)
         else:
@@ -158,7 +178,8 @@ async def handle_number_input(message):
             await bot.send_message(message.chat.id, formatted_ad, reply_markup=markup, parse_mode='HTML')
     else:
         formatted_ad = (
-            "Номер введен неверно. Пожалуйста, убедитесь, что номер соответствует формату A123BC45 и попробуйте снова.")
+            "Номер введен неверно. Пожалуйста, убедитесь, что номер соответствует формату A123BC45 "
+            "или введите его начало, например A123, и попробуйте снова.")
         await bot.send_message(message.chat.id, formatted_ad, reply_markup=markup, parse_mode='HTML')
 
 
@@ -248,37 +269,52 @@ async def run_bot():
 @app.post("/notify/")
 async def notify_new_ad(ad_detail: dict):
     subscribed_users = read_json(subscribed_users_path)
-    session = Session()
     try:
         car_number = ad_detail.get('car_number')
         if not car_number:
             car_number = 'отсутствует / не определён'
 
-        existing_ads = session.query(Advertisement).join(CarNumber).filter(CarNumber.number == car_number).all()
+        existing_ad_links = await get_ad_links_by_number(car_number)
 
-        ads_count = len(existing_ads)
+        ads_count = len(existing_ad_links)
 
         if ads_count > 1:
-            ad_links = [ad.ad_link for ad in existing_ads if ad.ad_link != ad_detail['ad_link']]
+            ad_links = [ad_link for ad_link in existing_ad_links if ad_link != ad_detail['ad_link']]
             ad_detail['existing_ads_links'] = ad_links
 
         ad_info = [ad_detail]
         message = format_ads_info(ad_info, is_new_ad=True, ads_count=ads_count if ads_count > 1 else None)
 
-        for user_id in subscribed_users.values():
-            try:
-                await bot.send_message(user_id, message, parse_mode='HTML')
-            except Exception as e:
-                logger.error(f"Ошибка при отправке уведомления пользователю {user_id}: {e}")
+        with timed('notify'):
+            for user_id in subscribed_users.values():
+                try:
+                    await bot.send_message(user_id, message, parse_mode='HTML')
+                except Exception as e:
+                    logger.error(f"Ошибка при отправке уведомления пользователю {user_id}: {e}")
         logger.info("Уведомление о новом объявлении отправлено.")
     except Exception as e:
         logger.error(f"Ошибка при отправке уведомления о новом объявлении: {e}")
-    finally:
-        session.close()
 
     return Response("OK", status=200)
 
 
+@app.post("/search-cache/invalidate")
+async def invalidate_search_cache(data: dict):
+    search_cache.invalidate_plates(data.get('numbers', []))
+    return Response("OK", status_code=200)
+
+
+@app.get("/metrics")
+async def metrics():
+    return Response(metrics_registry.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.post("/metrics/push")
+async def push_metrics(data: dict):
+    metrics_registry.merge(data)
+    return Response("OK", status_code=200)
+
+
 async def run_server():
     config = uvicorn.Config(app=app, host="127.0.0.1", port=8000, loop="asyncio")
     server = uvicorn.Server(config)
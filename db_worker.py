@@ -1,6 +1,15 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, create_engine
+import json
+import os
+import re
+from datetime import datetime, timedelta
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, create_engine, func, select, event, inspect, text, \
+    delete
+from sqlalchemy.dialects import sqlite, postgresql
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import declarative_base, sessionmaker, relationship, scoped_session
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from logger import setup_logger
+from plate_search import plate_search_keys, rank_candidates, FUZZY_MAX_DISTANCE, SEARCH_KEYS_VERSION
 
 logger = setup_logger(__name__)
 
@@ -17,93 +26,550 @@ class Advertisement(Base):
     phone_number = Column(String)
     ad_id = Column(String, unique=True)
     ad_link = Column(String)
-    car_number = Column(String, ForeignKey('car_numbers.number'))
+    car_number = Column(String, ForeignKey('car_numbers.number'), index=True)
     car_number_rel = relationship("CarNumber", back_populates="advertisements")
 
 
 class CarNumber(Base):
     __tablename__ = 'car_numbers'
     number = Column(String, primary_key=True)
+    normalized_number = Column(String, index=True)
     advertisements = relationship("Advertisement", order_by=Advertisement.id, back_populates="car_number_rel")
 
 
-engine = create_engine('sqlite:///volume/ads.db')
+class PlateSearchKey(Base):
+    __tablename__ = 'plate_search_keys'
+    key = Column(String, primary_key=True)
+    number = Column(String, ForeignKey('car_numbers.number'), primary_key=True, index=True)
+
+
+class SchemaMeta(Base):
+    __tablename__ = 'schema_meta'
+    key = Column(String, primary_key=True)
+    value = Column(String, nullable=False)
+
+
+class FrontierAd(Base):
+    __tablename__ = 'ad_frontier'
+    data_id = Column(Integer, primary_key=True)
+    title = Column(String)
+    item_url = Column(String, nullable=False)
+    chassis_info = Column(String)
+    price = Column(String)
+    city = Column(String)
+    phone_number = Column(String)
+    status = Column(String, nullable=False, default='pending', index=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    discovered_at = Column(DateTime, server_default=func.now())
+
+
+class CachedPhoneNumber(Base):
+    __tablename__ = 'phone_numbers_cache'
+    sale_id = Column(Integer, primary_key=True)
+    phone_number = Column(String)
+    fetched_at = Column(DateTime, nullable=False)
+
+
+class RecognizedImage(Base):
+    __tablename__ = 'image_recognition_cache'
+    image_url = Column(String, primary_key=True)
+    content_hash = Column(String, nullable=False, index=True)
+    image_size = Column(String, nullable=False)
+    model_version = Column(String, nullable=False)
+    readings = Column(String, nullable=False)
+    last_used = Column(DateTime, nullable=False, index=True)
+
+
+PLATE_LOOKALIKES = str.maketrans({
+    'A': 'А', 'B': 'В', 'E': 'Е', 'K': 'К', 'M': 'М',
+    'H': 'Н', 'O': 'О', 'P': 'Р', 'C': 'С', 'T': 'Т',
+    'Y': 'У', 'X': 'Х', 'Ё': 'Е',
+})
+PLATE_SEARCH_LIMIT = 20
+
+
+def normalize_plate(number):
+    """
+    Canonical plate key: upper case, no separators, latin lookalikes replaced with cyrillic letters.
+    """
+    return re.sub(r'[^0-9A-ZА-ЯЁ]', '', (number or '').upper()).translate(PLATE_LOOKALIKES)
+
+
+FRONTIER_PENDING = 'pending'
+FRONTIER_DONE = 'done'
+FRONTIER_FAILED = 'failed'
+FRONTIER_MAX_ATTEMPTS = 3
+
+DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///volume/ads.db')
+ASYNC_DATABASE_URL = os.getenv('ASYNC_DATABASE_URL', 'sqlite+aiosqlite:///volume/ads.db')
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+SQLITE_BUSY_TIMEOUT_MS = 5000
+
+
+def enable_sqlite_wal(dbapi_connection, connection_record):
+    # WAL lets the bot read while main.py writes, busy_timeout waits for the writer lock instead of failing
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.close()
+
+
+engine = create_engine(DATABASE_URL)
+if engine.dialect.name == 'sqlite':
+    event.listen(engine, 'connect', enable_sqlite_wal)
 Base.metadata.create_all(engine)
 
 Session = scoped_session(sessionmaker(bind=engine))
 
 
-def add_advertisement(ad_detail):
+SEARCH_KEYS_CHUNK_SIZE = 500
+
+
+def upsert_insert(table):
+    if engine.dialect.name == 'postgresql':
+        return postgresql.insert(table)
+    return sqlite.insert(table)
+
+
+def plate_search_key_rows(normalized_numbers):
+    return [{'key': key, 'number': number}
+            for number, normalized in normalized_numbers.items()
+            for key in sorted(plate_search_keys(normalized))]
+
+
+def migrate_schema():
+    car_numbers_columns = {column['name'] for column in inspect(engine).get_columns(CarNumber.__tablename__)}
+    recognition_cache_columns = {column['name']
+                                 for column in inspect(engine).get_columns(RecognizedImage.__tablename__)}
+    with engine.begin() as connection:
+        if 'model_version' not in recognition_cache_columns:
+            # readings cached without model version and image size can't be verified, the cache is rebuilt
+            logger.info("Миграция: пересоздание кэша распознанных изображений.")
+            RecognizedImage.__table__.drop(connection)
+            RecognizedImage.__table__.create(connection)
+        if 'normalized_number' not in car_numbers_columns:
+            logger.info("Миграция: добавление нормализованного номера в таблицу car_numbers.")
+            connection.execute(text("ALTER TABLE car_numbers ADD COLUMN normalized_number VARCHAR"))
+        numbers = connection.execute(select(CarNumber.number).filter(CarNumber.normalized_number.is_(None))).scalars()
+        backfill = [{'number_key': number, 'normalized': normalize_plate(number)} for number in numbers]
+        if backfill:
+            connection.execute(text("UPDATE car_numbers SET normalized_number = :normalized WHERE number = :number_key"),
+                               backfill)
+            logger.info(f"Миграция: нормализовано номеров {len(backfill)}.")
+        for index in list(CarNumber.__table__.indexes) + list(Advertisement.__table__.indexes):
+            index.create(connection, checkfirst=True)
+        keys_version = connection.execute(
+            select(SchemaMeta.value).filter(SchemaMeta.key == 'plate_search_keys_version')).scalar()
+        if keys_version != str(SEARCH_KEYS_VERSION):
+            rebuild_plate_search_keys(connection)
+            connection.execute(delete(SchemaMeta).filter(SchemaMeta.key == 'plate_search_keys_version'))
+            connection.execute(SchemaMeta.__table__.insert().values(key='plate_search_keys_version',
+                                                                    value=str(SEARCH_KEYS_VERSION)))
+
+
+def rebuild_plate_search_keys(connection):
+    connection.execute(delete(PlateSearchKey))
+    numbers = connection.execute(select(CarNumber.number, CarNumber.normalized_number)).all()
+    for start in range(0, len(numbers), SEARCH_KEYS_CHUNK_SIZE):
+        connection.execute(PlateSearchKey.__table__.insert(),
+                           plate_search_key_rows(dict(numbers[start:start + SEARCH_KEYS_CHUNK_SIZE])))
+    if numbers:
+        logger.info(f"Миграция: построен индекс нечёткого поиска для номеров {len(numbers)}.")
+
+
+migrate_schema()
+
+async_engine = create_async_engine(ASYNC_DATABASE_URL, poolclass=AsyncAdaptedQueuePool,
+                                   pool_size=DB_POOL_SIZE, pool_pre_ping=True)
+if async_engine.dialect.name == 'sqlite':
+    event.listen(async_engine.sync_engine, 'connect', enable_sqlite_wal)
+
+AsyncSession = async_sessionmaker(async_engine, expire_on_commit=False)
+
+
+UPSERT_CHUNK_SIZE = 100
+
+car_numbers_listeners = []
+
+
+def add_car_numbers_listener(listener):
+    """
+    listener(normalized_numbers) is called after advertisements with these plates are added
+    """
+    car_numbers_listeners.append(listener)
+
+
+def notify_car_numbers_added(normalized_numbers):
+    for listener in car_numbers_listeners:
+        try:
+            listener(normalized_numbers)
+        except Exception as e:
+            logger.error(f"Ошибка при обработке добавленных номеров {normalized_numbers}: {e}")
+
+
+def advertisement_row(ad_detail):
+    if 'title' not in ad_detail or 'car_number' not in ad_detail:
+        raise ValueError("Недостаточно данных для добавления объявления.")
+    return {
+        'title': ad_detail['title'],
+        'year': int(ad_detail['additional_info'].get('Год', 0)),
+        'drive': ad_detail['additional_info'].get('Привод', ''),
+        'city': ad_detail['additional_info'].get('Город', ''),
+        'phone_number': ad_detail.get('phone_number', ''),
+        'price': ad_detail.get('price', 0),
+        'ad_id': ad_detail.get('ad_id', ''),
+        'ad_link': ad_detail.get('ad_link', ''),
+        'car_number': ad_detail['car_number'],
+    }
+
+
+def add_advertisements(ad_details):
+    """
+    Inserts advertisements and their car numbers in one transaction,
+    returns lists of inserted and already existing ad_id.
+    Ads with incomplete data are in neither list, a failed transaction is re-raised.
+    """
+    rows = {}
+    for ad_detail in ad_details:
+        try:
+            row = advertisement_row(ad_detail)
+        except (ValueError, TypeError, KeyError) as e:
+            logger.error(f"Объявление {ad_detail.get('ad_id')} пропущено: {e}")
+            continue
+        rows.setdefault(row['ad_id'], row)
+    if not rows:
+        return [], []
+
+    rows = list(rows.values())
     session = Session()
     try:
-        if 'title' not in ad_detail or 'car_number' not in ad_detail:
-            logger.error("Недостаточно данных для добавления объявления.")
-            raise ValueError("Недостаточно данных для добавления объявления.")
-
-        existing_ad = session.query(Advertisement).filter_by(ad_id=ad_detail['ad_id']).first()
-        if existing_ad:
-            logger.warning(f"Объявление с ad_id={ad_detail['ad_id']} уже существует. Пропуск добавления.")
-            return False
-
-        year_int = int(ad_detail['additional_info'].get('Год', 0))
-
-        car_number = session.query(CarNumber).filter_by(number=ad_detail['car_number']).first()
-        if not car_number:
-            car_number = CarNumber(number=ad_detail['car_number'])
-            session.add(car_number)
-
-        new_ad = Advertisement(
-            title=ad_detail['title'],
-            year=year_int,
-            drive=ad_detail['additional_info'].get('Привод', ''),
-            city=ad_detail['additional_info'].get('Город', ''),
-            phone_number=ad_detail.get('phone_number', ''),
-            price=ad_detail.get('price', 0),
-            ad_id=ad_detail.get('ad_id', ''),
-            ad_link=ad_detail.get('ad_link', ''),
-            car_number_rel=car_number
-        )
-        session.add(new_ad)
+        car_numbers = {number: normalize_plate(number) for number in sorted({row['car_number'] for row in rows})}
+        session.execute(upsert_insert(CarNumber).values([{'number': number, 'normalized_number': normalized}
+                                                         for number, normalized in car_numbers.items()])
+                        .on_conflict_do_nothing(index_elements=['number']))
+        key_rows = plate_search_key_rows(car_numbers)
+        for start in range(0, len(key_rows), SEARCH_KEYS_CHUNK_SIZE):
+            session.execute(upsert_insert(PlateSearchKey).values(key_rows[start:start + SEARCH_KEYS_CHUNK_SIZE])
+                            .on_conflict_do_nothing(index_elements=['key', 'number']))
+        inserted = set()
+        for start in range(0, len(rows), UPSERT_CHUNK_SIZE):
+            result = session.execute(upsert_insert(Advertisement).values(rows[start:start + UPSERT_CHUNK_SIZE])
+                                     .on_conflict_do_nothing(index_elements=['ad_id'])
+                                     .returning(Advertisement.ad_id))
+            inserted.update(result.scalars().all())
         session.commit()
-        logger.info(f"Объявление успешно добавлено: {ad_detail['title']}")
-        return True
     except Exception as e:
-        logger.error(f"Ошибка при добавлении объявления в базу данных: {e}")
+        logger.error(f"Ошибка при добавлении объявлений в базу данных: {e}")
         session.rollback()
-        return False
+        raise
     finally:
         session.close()
 
+    inserted_ids = [row['ad_id'] for row in rows if row['ad_id'] in inserted]
+    duplicate_ids = [row['ad_id'] for row in rows if row['ad_id'] not in inserted]
+    if inserted_ids:
+        notify_car_numbers_added(sorted({normalize_plate(row['car_number']) for row in rows
+                                         if row['ad_id'] in inserted}))
+    logger.info(f"Добавлено объявлений: {len(inserted_ids)}, уже существовали: {len(duplicate_ids)}")
+    return inserted_ids, duplicate_ids
 
-async def search_ads_by_number(car_number):
-    session = Session()
+
+def add_advertisement(ad_detail):
     try:
-        car_number_obj = session.query(CarNumber).filter_by(number=car_number).first()
-        if not car_number_obj:
-            logger.info(f"Номер автомобиля {car_number} не найден в базе.")
-            return []
+        inserted_ids, duplicate_ids = add_advertisements([ad_detail])
+    except Exception:
+        return False
+    if duplicate_ids:
+        logger.warning(f"Объявление с ad_id={ad_detail['ad_id']} уже существует. Пропуск добавления.")
+    return bool(inserted_ids)
+
+
+def advertisement_info(ad):
+    return {
+        'title': ad.title,
+        'year': ad.year,
+        'drive': ad.drive,
+        'price': ad.price,
+        'car_number': ad.car_number,
+        'city': ad.city,
+        'phone_number': ad.phone_number,
+        'ad_link': ad.ad_link
+    }
+
 
-        ads = session.query(Advertisement).filter_by(car_number=car_number_obj.number).all()
+async def search_ads_by_number(car_number):
+    try:
+        async with AsyncSession() as session:
+            ads = (await session.scalars(
+                select(Advertisement).join(CarNumber)
+                .filter(CarNumber.normalized_number == normalize_plate(car_number))
+            )).all()
         if not ads:
             logger.info(f"Объявления для автомобиля с номером {car_number} не найдены.")
             return []
 
-        ads_info = [{
-            'title': ad.title,
-            'year': ad.year,
-            'drive': ad.drive,
-            'price': ad.price,
-            'car_number': ad.car_number,
-            'city': ad.city,
-            'phone_number': ad.phone_number,
-            'ad_link': ad.ad_link
-        } for ad in ads]
+        ads_info = [advertisement_info(ad) for ad in ads]
 
         logger.info(f"Найдены объявления для номера {car_number}: {ads_info}")
         return ads_info
     except Exception as e:
         logger.error(f"Ошибка при поиске объявлений по номеру автомобиля: {e}")
         return []
+
+
+async def search_ads_by_plate_prefix(prefix, limit=PLATE_SEARCH_LIMIT):
+    prefix = normalize_plate(prefix)
+    if not prefix:
+        return []
+    try:
+        async with AsyncSession() as session:
+            # range instead of LIKE so that the index on normalized_number is always used
+            ads = (await session.scalars(
+                select(Advertisement).join(CarNumber)
+                .filter(CarNumber.normalized_number >= prefix, CarNumber.normalized_number < prefix + '\uffff')
+                .order_by(CarNumber.normalized_number, Advertisement.id)
+                .limit(limit)
+            )).all()
+        logger.info(f"По началу номера {prefix} найдено объявлений: {len(ads)}")
+        return [advertisement_info(ad) for ad in ads]
+    except Exception as e:
+        logger.error(f"Ошибка при поиске объявлений по началу номера {prefix}: {e}")
+        return []
+
+
+async def search_ads_by_similar_number(car_number, max_distance=FUZZY_MAX_DISTANCE, limit=PLATE_SEARCH_LIMIT):
+    """
+    Advertisements with plates within max_distance of car_number, nearest first.
+    Every ad gets 'match_distance' with the confusion-aware edit distance of its plate.
+    """
+    normalized = normalize_plate(car_number)
+    if not normalized:
+        return []
+    try:
+        async with AsyncSession() as session:
+            candidates = (await session.execute(
+                select(CarNumber.number, CarNumber.normalized_number).join(PlateSearchKey)
+                .filter(PlateSearchKey.key.in_(plate_search_keys(normalized)))
+                .distinct()
+            )).all()
+            numbers = {normalized_number: number for number, normalized_number in candidates}
+            ranked = rank_candidates(normalized, numbers, max_distance)[:limit]
+            if not ranked:
+                logger.info(f"Похожие номера для {normalized} не найдены.")
+                return []
+            ads = (await session.scalars(
+                select(Advertisement).filter(Advertisement.car_number.in_([numbers[n] for _, n in ranked]))
+            )).all()
+        distances = {numbers[n]: distance for distance, n in ranked}
+        ads_info = []
+        for ad in sorted(ads, key=lambda ad: (distances[ad.car_number], ad.car_number, ad.id)):
+            ad_info = advertisement_info(ad)
+            ad_info['match_distance'] = distances[ad.car_number]
+            ads_info.append(ad_info)
+        logger.info(f"Для номера {normalized} найдено похожих объявлений: {len(ads_info)}")
+        return ads_info[:limit]
+    except Exception as e:
+        logger.error(f"Ошибка при нечётком поиске объявлений по номеру {normalized}: {e}")
+        return []
+
+
+async def get_ad_links_by_number(car_number):
+    try:
+        async with AsyncSession() as session:
+            return list((await session.scalars(
+                select(Advertisement.ad_link).join(CarNumber)
+                .filter(CarNumber.normalized_number == normalize_plate(car_number))
+            )).all())
+    except Exception as e:
+        logger.error(f"Ошибка при получении объявлений по номеру автомобиля {car_number}: {e}")
+        return []
+
+
+def get_frontier_high_water_mark():
+    session = Session()
+    try:
+        return session.query(func.max(FrontierAd.data_id)).scalar()
+    finally:
+        session.close()
+
+
+def get_known_ad_ids(data_ids):
+    session = Session()
+    try:
+        data_ids = [int(data_id) for data_id in data_ids]
+        rows = session.query(FrontierAd.data_id).filter(FrontierAd.data_id.in_(data_ids)).all()
+        return {str(row.data_id) for row in rows}
+    finally:
+        session.close()
+
+
+def enqueue_ads(ads):
+    session = Session()
+    try:
+        known_ids = {row.data_id for row in session.query(FrontierAd.data_id)
+                     .filter(FrontierAd.data_id.in_([int(ad['data_id']) for ad in ads])).all()}
+        new_ads = []
+        for ad in ads:
+            data_id = int(ad['data_id'])
+            if data_id in known_ids:
+                continue
+            known_ids.add(data_id)
+            session.add(FrontierAd(
+                data_id=data_id,
+                title=ad['title'],
+                item_url=ad['item_url'],
+                chassis_info=ad.get('chassis_info'),
+                price=ad.get('price'),
+                city=ad.get('city'),
+                phone_number=ad.get('phone_number'),
+                status=FRONTIER_PENDING,
+            ))
+            new_ads.append(ad)
+        session.commit()
+        logger.info(f"Добавлено в очередь обработки объявлений: {len(new_ads)}")
+        return new_ads
+    except Exception as e:
+        logger.error(f"Ошибка при добавлении объявлений в очередь обработки: {e}")
+        session.rollback()
+        return []
     finally:
         session.close()
 
+
+def get_pending_ads(limit=None):
+    """
+    Newest pending ads first, so a backlog left by a crawl gap doesn't delay fresh ads.
+    """
+    session = Session()
+    try:
+        query = session.query(FrontierAd).filter_by(status=FRONTIER_PENDING).order_by(FrontierAd.data_id.desc())
+        if limit:
+            query = query.limit(limit)
+        pending_ads = []
+        for frontier_ad in query.all():
+            if frontier_ad.attempts >= FRONTIER_MAX_ATTEMPTS:
+                logger.warning(f"Объявление {frontier_ad.data_id} не обработано за {frontier_ad.attempts} попыток.")
+                frontier_ad.status = FRONTIER_FAILED
+                continue
+            frontier_ad.attempts += 1
+            pending_ads.append({
+                'data_id': str(frontier_ad.data_id),
+                'title': frontier_ad.title,
+                'item_url': frontier_ad.item_url,
+                'chassis_info': frontier_ad.chassis_info,
+                'price': frontier_ad.price,
+                'city': frontier_ad.city,
+                'phone_number': frontier_ad.phone_number,
+            })
+        session.commit()
+        return pending_ads
+    except Exception as e:
+        logger.error(f"Ошибка при получении объявлений из очереди обработки: {e}")
+        session.rollback()
+        return []
+    finally:
+        session.close()
+
+
+def mark_ad_processed(data_id, status=FRONTIER_DONE):
+    mark_ads_processed([data_id], status)
+
+
+def mark_ads_processed(data_ids, status=FRONTIER_DONE):
+    if not data_ids:
+        return
+    session = Session()
+    try:
+        session.query(FrontierAd).filter(FrontierAd.data_id.in_([int(data_id) for data_id in data_ids])) \
+            .update({FrontierAd.status: status}, synchronize_session=False)
+        session.commit()
+    except Exception as e:
+        logger.error(f"Ошибка при обновлении статуса объявлений {data_ids} в очереди обработки: {e}")
+        session.rollback()
+    finally:
+        session.close()
+
+
+def get_cached_phone_numbers(sale_ids, ttl_seconds):
+    session = Session()
+    try:
+        fresh_since = datetime.utcnow() - timedelta(seconds=ttl_seconds)
+        rows = session.query(CachedPhoneNumber).filter(
+            CachedPhoneNumber.sale_id.in_([int(sale_id) for sale_id in sale_ids]),
+            CachedPhoneNumber.fetched_at >= fresh_since,
+        ).all()
+        return {str(row.sale_id): row.phone_number for row in rows}
+    except Exception as e:
+        logger.error(f"Ошибка при чтении кэша телефонных номеров: {e}")
+        return {}
+    finally:
+        session.close()
+
+
+def save_phone_numbers(phone_numbers):
+    session = Session()
+    try:
+        fetched_at = datetime.utcnow()
+        for sale_id, phone_number in phone_numbers.items():
+            session.merge(CachedPhoneNumber(sale_id=int(sale_id), phone_number=phone_number, fetched_at=fetched_at))
+        session.commit()
+    except Exception as e:
+        logger.error(f"Ошибка при сохранении кэша телефонных номеров: {e}")
+        session.rollback()
+    finally:
+        session.close()
+
+
+def get_cached_recognitions(model_version, image_urls=(), content_hashes=()):
+    """
+    Readings cached by model_version, returns readings by image url
+    and readings by content hash and image size.
+    """
+    session = Session()
+    try:
+        rows = []
+        if image_urls:
+            rows += session.query(RecognizedImage).filter(RecognizedImage.image_url.in_(list(image_urls)),
+                                                          RecognizedImage.model_version == model_version).all()
+        if content_hashes:
+            rows += session.query(RecognizedImage).filter(RecognizedImage.content_hash.in_(list(content_hashes)),
+                                                          RecognizedImage.model_version == model_version).all()
+        last_used = datetime.utcnow()
+        by_url, by_hash = {}, {}
+        for row in rows:
+            row.last_used = last_used
+            readings = json.loads(row.readings)
+            by_url[row.image_url] = readings
+            by_hash[(row.content_hash, row.image_size)] = readings
+        session.commit()
+        return by_url, by_hash
+    except Exception as e:
+        logger.error(f"Ошибка при чтении кэша распознанных изображений: {e}")
+        session.rollback()
+        return {}, {}
+    finally:
+        session.close()
+
+
+def save_recognitions(recognitions, model_version, max_entries):
+    session = Session()
+    try:
+        last_used = datetime.utcnow()
+        for image_url, (content_hash, image_size, readings) in recognitions.items():
+            session.merge(RecognizedImage(image_url=image_url, content_hash=content_hash, image_size=image_size,
+                                          model_version=model_version, readings=json.dumps(readings),
+                                          last_used=last_used))
+        session.flush()
+        stale_urls = select(RecognizedImage.image_url) \
+            .order_by(RecognizedImage.last_used.desc()).offset(max_entries)
+        evicted = session.query(RecognizedImage).filter(RecognizedImage.image_url.in_(stale_urls)) \
+            .delete(synchronize_session=False)
+        session.commit()
+        if evicted:
+            logger.debug(f"Из кэша распознанных изображений вытеснено записей: {evicted}")
+    except Exception as e:
+        logger.error(f"Ошибка при сохранении кэша распознанных изображений: {e}")
+        session.rollback()
+    finally:
+        session.close()
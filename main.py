@@ -1,16 +1,24 @@
 import os
 import requests
 from ad_list_parser import parse_ads_list
-from ad_details_parser import get_ad_details
-from photo_processor import download_and_save_images, recognize_number_plates, cleanup_temp_images, \
-    find_most_common_number
-from db_worker import add_advertisement
+from ad_details_parser import get_ad_details, get_ads_details, get_browser_pool
+from photo_processor import recognize_ad_number_plates, find_most_common_number
+from phone_lookup import get_phone_numbers
+from db_worker import add_advertisements, mark_ad_processed, mark_ads_processed, add_car_numbers_listener, \
+    FRONTIER_DONE, FRONTIER_FAILED
 import json
 from logger import setup_logger
+from metrics import timed, registry, push_metrics
+from search_cache import push_search_cache_invalidation
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 logger = setup_logger(__name__)
 
+ADS_IN_FLIGHT = 4
+
+add_car_numbers_listener(push_search_cache_invalidation)
+
 
 def save_failed_ads(failed_ads):
     filename = 'volume/failed_ads.json'
@@ -50,6 +58,7 @@ def notify_bot_about_new_ad(ad_detail):
 
 def main_process():
     logger.info("Начало работы функции main_process.")
+    get_browser_pool().warm_up()
     ads_list = parse_ads_list()
     # for ad in ads_list:
     #     chassis_parts = ad['chassis_info'].split(", ")
@@ -81,23 +90,26 @@ def main_process():
     #     # notify_bot_about_new_ad(ad_detail)
     if not ads_list:
         logger.info("Новых объявлений для обработки не найдено. Процесс завершён.")
+        push_metrics()
         return
 
     failed_ads = []
+    recognized_ads = []
+    prepared_ads = []
+    ads_details = get_ads_details([ad['item_url'] for ad in ads_list])
 
-    for ad in ads_list:
+    for ad, ad_detail in zip(ads_list, ads_details):
         title_parts = ad['title'].split(", ")
         if len(title_parts) > 1 and title_parts[-1].strip().isdigit() and len(title_parts[-1].strip()) == 4:
             title_without_year = ", ".join(title_parts[:-1]).strip()
         else:
             title_without_year = ad['title']
 
-        logger.info(f"Обработка объявления: {title_without_year} с URL: {ad['item_url']}")
+        logger.info(f"Обработка объявления: {title_without_year} с URL: {ad['item_url']} "
+                    f"(данные получены через {ad_detail.get('source', 'browser')})")
 
-        ad_detail = get_ad_details(ad['item_url'])
         ad_detail['title'] = title_without_year
         ad_detail['ad_id'] = ad['data_id']
-        ad_detail['phone_number'] = ad['phone_number']
         ad_detail['price'] = ad['price']
         if not ad_detail['image_urls']:
             logger.warning(f"Изображения не найдены для объявления: {ad['item_url']}. Попытка повторного запроса "
@@ -107,18 +119,23 @@ def main_process():
             ad_detail['title'] = title_without_year
             ad_detail['ad_id'] = ad['data_id']
             logger.debug(f"ad_detail['ad_id'] = {ad_detail['ad_id'] } - ad['data_id'] = {ad['data_id']}")
-            ad_detail['phone_number'] = ad['phone_number']
             ad_detail['price'] = ad['price']
             logger.warning(f"Повторная попытка добавления объявления: {ad_detail}")
             if not ad_detail['image_urls']:
                 logger.warning(f"Изображения по-прежнему не найдены для объявления: {ad['item_url']}. Объявление "
                                f"будет помечено как неудачное.")
                 failed_ads.append(ad['data_id'])
+                mark_ad_processed(ad['data_id'], FRONTIER_FAILED)
                 continue
 
-        temp_images_paths = download_and_save_images(ad_detail['image_urls'])
-        recognized_texts = recognize_number_plates(temp_images_paths)
+        prepared_ads.append((ad, ad_detail))
 
+    with ThreadPoolExecutor(max_workers=ADS_IN_FLIGHT) as executor:
+        ads_recognized_texts = list(executor.map(
+            lambda ad_detail: recognize_ad_number_plates(ad_detail['image_urls']),
+            [ad_detail for _, ad_detail in prepared_ads]))
+
+    for (ad, ad_detail), recognized_texts in zip(prepared_ads, ads_recognized_texts):
         if not any(recognized_texts):
             logger.warning(
                 f"Номера не распознаны для объявления: {ad['item_url']}. Объявление будет помечено как неудачное.")
@@ -127,24 +144,41 @@ def main_process():
         else:
             most_common_number = find_most_common_number(recognized_texts)
             if most_common_number:
-                ad_detail.update({
-                    'car_number': most_common_number,
-                    'phone_number': ad_detail.get('phone_number', '')
-                })
-                try:
-                    logger.info(f"Добавление объявления в базу данных: {ad_detail}")
-                    if add_advertisement(ad_detail):
-                        logger.info(f"Объявление {title_without_year} успешно добавлено в базу данных.")
-                    else:
-                        logger.info(f"Объявление {title_without_year} c {ad['ad_id']} уже существует в базе данных.")
-                except Exception as e:
-                    logger.error(f"Ошибка при добавлении объявления в базу данных: {e}")
-            else:
-                logger.warning(
-                    f"Не удалось идентифицировать наиболее часто встречающийся номер для объявления: {ad['item_url']}.")
-                failed_ads.append(ad['data_id'])
+                ad_detail['car_number'] = most_common_number
+                recognized_ads.append(ad_detail)
+                continue
+            logger.warning(
+                f"Не удалось идентифицировать наиболее часто встречающийся номер для объявления: {ad['item_url']}.")
+            failed_ads.append(ad['data_id'])
 
-        cleanup_temp_images(temp_images_paths)
+        mark_ad_processed(ad['data_id'], FRONTIER_FAILED)
+
+    phone_numbers = get_phone_numbers([ad_detail['ad_id'] for ad_detail in recognized_ads])
+    for ad_detail in recognized_ads:
+        ad_detail['phone_number'] = phone_numbers.get(ad_detail['ad_id']) or ''
+        logger.info(f"Добавление объявления в базу данных: {ad_detail}")
+    try:
+        with timed('db_write'):
+            inserted_ids, duplicate_ids = add_advertisements(recognized_ads)
+    except Exception:
+        # ads stay pending and are retried next cycle until FRONTIER_MAX_ATTEMPTS
+        logger.error(f"Объявления не сохранены и остаются в очереди обработки: "
+                     f"{[ad_detail['ad_id'] for ad_detail in recognized_ads]}")
+        inserted_ids, duplicate_ids = None, []
+    for ad_id in duplicate_ids:
+        logger.info(f"Объявление c {ad_id} уже существует в базе данных.")
+    if inserted_ids is not None:
+        saved_ids = {str(ad_id) for ad_id in inserted_ids + duplicate_ids}
+        mark_ads_processed(sorted(saved_ids), FRONTIER_DONE)
+        skipped_ids = [ad_detail['ad_id'] for ad_detail in recognized_ads if str(ad_detail['ad_id']) not in saved_ids]
+        if skipped_ids:
+            failed_ads.extend(skipped_ids)
+            mark_ads_processed(skipped_ids, FRONTIER_FAILED)
+
+    registry.inc('ads_processed', len(ads_list))
+    registry.inc('ads_recognized', len(recognized_ads))
+    registry.inc('ads_failed', len(failed_ads))
+    push_metrics()
 
     if failed_ads:
         save_failed_ads(failed_ads)
@@ -0,0 +1,142 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+import requests
+from logger import setup_logger
+
+logger = setup_logger(__name__)
+
+METRICS_PUSH_URL = os.getenv('METRICS_PUSH_URL', 'http://localhost:8000/metrics/push')
+METRICS_PUSH_INTERVAL = float(os.getenv('METRICS_PUSH_INTERVAL', '15'))
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+STAGES = (
+    'list_fetch',
+    'detail_scrape',
+    'image_download',
+    'localization',
+    'key_points',
+    'classification',
+    'ocr',
+    'db_write',
+    'notify',
+)
+
+
+class MetricsRegistry:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+
+    def _histogram(self, stage):
+        if stage not in self._histograms:
+            self._histograms[stage] = {'buckets': [0] * (len(self.buckets) + 1), 'sum': 0.0, 'count': 0}
+        return self._histograms[stage]
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            histogram = self._histogram(stage)
+            histogram['buckets'][bisect_left(self.buckets, seconds)] += 1
+            histogram['sum'] += seconds
+            histogram['count'] += 1
+
+    def inc(self, counter, value=1):
+        with self._lock:
+            self._counters[counter] = self._counters.get(counter, 0) + value
+
+    def snapshot(self, reset=False):
+        with self._lock:
+            data = {
+                'histograms': {stage: {'buckets': list(h['buckets']), 'sum': h['sum'], 'count': h['count']}
+                               for stage, h in self._histograms.items()},
+                'counters': dict(self._counters),
+            }
+            if reset:
+                self._histograms = {}
+                self._counters = {}
+        return data
+
+    def merge(self, data):
+        with self._lock:
+            for stage, other in data.get('histograms', {}).items():
+                if len(other['buckets']) != len(self.buckets) + 1:
+                    logger.warning(f"Несовместимые корзины гистограммы для этапа {stage}, данные пропущены.")
+                    continue
+                histogram = self._histogram(stage)
+                histogram['buckets'] = [a + b for a, b in zip(histogram['buckets'], other['buckets'])]
+                histogram['sum'] += other['sum']
+                histogram['count'] += other['count']
+            for counter, value in data.get('counters', {}).items():
+                self._counters[counter] = self._counters.get(counter, 0) + value
+
+    def render(self):
+        data = self.snapshot()
+        lines = [
+            '# HELP nomnet_stage_duration_seconds Duration of processing stages.',
+            '# TYPE nomnet_stage_duration_seconds histogram',
+        ]
+        stages = list(STAGES) + sorted(set(data['histograms']) - set(STAGES))
+        for stage in stages:
+            histogram = data['histograms'].get(stage, {'buckets': [0] * (len(self.buckets) + 1),
+                                                       'sum': 0.0, 'count': 0})
+            cumulative = 0
+            for bound, count in zip(self.buckets, histogram['buckets']):
+                cumulative += count
+                lines.append(f'nomnet_stage_duration_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'nomnet_stage_duration_seconds_bucket{{stage="{stage}",le="+Inf"}} {histogram["count"]}')
+            lines.append(f'nomnet_stage_duration_seconds_sum{{stage="{stage}"}} {histogram["sum"]}')
+            lines.append(f'nomnet_stage_duration_seconds_count{{stage="{stage}"}} {histogram["count"]}')
+        for counter in sorted(data['counters']):
+            lines.append(f'# TYPE nomnet_{counter}_total counter')
+            lines.append(f'nomnet_{counter}_total {data["counters"][counter]}')
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+@contextmanager
+def timed(stage):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        registry.observe(stage, time.perf_counter() - started)
+
+
+def timed_call(stage, func):
+    def wrapper(*args, **kwargs):
+        with timed(stage):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def push_metrics(url=METRICS_PUSH_URL):
+    data = registry.snapshot(reset=True)
+    if not data['histograms'] and not data['counters']:
+        return
+    try:
+        response = requests.post(url, json=data, timeout=5)
+        response.raise_for_status()
+    except Exception as e:
+        logger.warning(f"Не удалось отправить метрики в сервис бота: {e}")
+        registry.merge(data)
+
+
+def start_metrics_pusher(interval=METRICS_PUSH_INTERVAL, url=METRICS_PUSH_URL):
+    """
+    Pushes metrics every interval seconds from a daemon thread,
+    so that long-running processes don't wait for the bot service on their hot path.
+    """
+    def run():
+        while True:
+            time.sleep(interval)
+            push_metrics(url)
+
+    thread = threading.Thread(target=run, name='metrics-pusher', daemon=True)
+    thread.start()
+    return thread
@@ -1,10 +1,26 @@
-from nomeroff_net.pipes.number_plate_keypoints_detectors.bbox_np_points import NpPointsCraft
-from nomeroff_net.pipes.number_plate_text_readers.text_detector import TextDetector
-from nomeroff_net.pipes.number_plate_classificators.options_detector import OptionsDetector
-from nomeroff_net.pipes.number_plate_classificators.inverse_detector import InverseDetector
-from nomeroff_net.pipes.number_plate_localizators.yolo_v5_detector import Detector
+import importlib
 
-from nomeroff_net.pipelines import pipeline
+# submodules are imported on first access, so `pipeline(task)` pulls in only the dependencies of that task
+_LAZY_ATTRIBUTES = {
+    "NpPointsCraft": "nomeroff_net.pipes.number_plate_keypoints_detectors.bbox_np_points",
+    "TextDetector": "nomeroff_net.pipes.number_plate_text_readers.text_detector",
+    "OptionsDetector": "nomeroff_net.pipes.number_plate_classificators.options_detector",
+    "InverseDetector": "nomeroff_net.pipes.number_plate_classificators.inverse_detector",
+    "Detector": "nomeroff_net.pipes.number_plate_localizators.yolo_v5_detector",
+    "pipeline": "nomeroff_net.pipelines",
+}
+
+
+def __getattr__(name):
+    if name not in _LAZY_ATTRIBUTES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_LAZY_ATTRIBUTES[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_LAZY_ATTRIBUTES))
 
 
 __version__ = "3.4.1"
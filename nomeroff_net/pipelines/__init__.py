@@ -14,82 +14,83 @@ The module contains the following functions:
 - `check_task(task)` - Returns task options if task supported? else raise KeyError.
 - `pipeline(task, image_loader, pipeline_kwargs, **kwargs)` - Returns Pipeline task object.
 """
-from typing import Any, Dict, Optional, Union
-
-from nomeroff_net.pipelines.base \
-    import Pipeline
-from nomeroff_net.image_loaders \
-    import BaseImageLoader
-from nomeroff_net.pipelines.number_plate_localization \
-    import NumberPlateLocalization
-from nomeroff_net.pipelines.number_plate_bbox_filling \
-    import NumberPlateBboxFilling
-from nomeroff_net.pipelines.number_plate_key_points_detection \
-    import NumberPlateKeyPointsDetection
-from nomeroff_net.pipelines.number_plate_key_points_filling \
-    import NumberPlateKeyPointsFilling
-from nomeroff_net.pipelines.number_plate_classification \
-    import NumberPlateClassification
-from nomeroff_net.pipelines.number_plate_text_reading \
-    import NumberPlateTextReading
-from nomeroff_net.pipelines.number_plate_detection_and_reading \
-    import NumberPlateDetectionAndReading
-from nomeroff_net.pipelines.number_plate_detection_and_reading_v2 \
-    import NumberPlateDetectionAndReadingV2
-from nomeroff_net.pipelines.number_plate_detection_and_reading_runtime \
-    import NumberPlateDetectionAndReadingRuntime
-from nomeroff_net.pipelines.number_plate_detection_and_reading_runtime_v2 \
-    import NumberPlateDetectionAndReadingRuntimeV2
-from nomeroff_net.pipelines.number_plate_short_detection_and_reading \
-    import NumberPlateShortDetectionAndReading
-from nomeroff_net.pipelines.multiline_number_plate_detection_and_reading \
-    import MultilineNumberPlateDetectionAndReading
-from nomeroff_net.pipelines.multiline_number_plate_detection_and_reading_runtime \
-    import MultilineNumberPlateDetectionAndReadingRuntime
+import importlib
+from typing import Any, Dict, Optional, Union, TYPE_CHECKING
 
+if TYPE_CHECKING:
+    from nomeroff_net.pipelines.base import Pipeline
+    from nomeroff_net.image_loaders import BaseImageLoader
 
+
+# "impl" is "module:class", the module is imported only when its task is requested
 SUPPORTED_TASKS = {
     "multiline_number_plate_detection_and_reading_runtime": {
-        "impl": MultilineNumberPlateDetectionAndReadingRuntime,
+        "impl": "nomeroff_net.pipelines.multiline_number_plate_detection_and_reading_runtime:MultilineNumberPlateDetectionAndReadingRuntime",
     },
     "multiline_number_plate_detection_and_reading": {
-        "impl": MultilineNumberPlateDetectionAndReading,
+        "impl": "nomeroff_net.pipelines.multiline_number_plate_detection_and_reading:MultilineNumberPlateDetectionAndReading",
     },
     "number_plate_short_detection_and_reading": {
-        "impl": NumberPlateShortDetectionAndReading,
+        "impl": "nomeroff_net.pipelines.number_plate_short_detection_and_reading:NumberPlateShortDetectionAndReading",
     },
     "number_plate_localization": {
-        "impl": NumberPlateLocalization,
+        "impl": "nomeroff_net.pipelines.number_plate_localization:NumberPlateLocalization",
     },
     "number_plate_bbox_filling": {
-        "impl": NumberPlateBboxFilling
+        "impl": "nomeroff_net.pipelines.number_plate_bbox_filling:NumberPlateBboxFilling",
     },
     "number_plate_key_points_detection": {
-        "impl": NumberPlateKeyPointsDetection
+        "impl": "nomeroff_net.pipelines.number_plate_key_points_detection:NumberPlateKeyPointsDetection",
     },
     "number_plate_key_points_filling": {
-        "impl": NumberPlateKeyPointsFilling
+        "impl": "nomeroff_net.pipelines.number_plate_key_points_filling:NumberPlateKeyPointsFilling",
     },
     "number_plate_classification": {
-        "impl": NumberPlateClassification
+        "impl": "nomeroff_net.pipelines.number_plate_classification:NumberPlateClassification",
     },
     "number_plate_text_reading": {
-        "impl": NumberPlateTextReading
+        "impl": "nomeroff_net.pipelines.number_plate_text_reading:NumberPlateTextReading",
     },
     "number_plate_detection_and_reading_v2": {
-        "impl": NumberPlateDetectionAndReadingV2
+        "impl": "nomeroff_net.pipelines.number_plate_detection_and_reading_v2:NumberPlateDetectionAndReadingV2",
     },
     "number_plate_detection_and_reading_runtime_v2": {
-        "impl": NumberPlateDetectionAndReadingRuntimeV2
+        "impl": "nomeroff_net.pipelines.number_plate_detection_and_reading_runtime_v2:NumberPlateDetectionAndReadingRuntimeV2",
     },
     "number_plate_detection_and_reading": {
-        "impl": NumberPlateDetectionAndReading
+        "impl": "nomeroff_net.pipelines.number_plate_detection_and_reading:NumberPlateDetectionAndReading",
     },
     "number_plate_detection_and_reading_runtime": {
-        "impl": NumberPlateDetectionAndReadingRuntime
+        "impl": "nomeroff_net.pipelines.number_plate_detection_and_reading_runtime:NumberPlateDetectionAndReadingRuntime",
+    },
+    "number_plate_detection_and_reading_ru": {
+        "impl": "nomeroff_net.pipelines.number_plate_detection_and_reading_ru:NumberPlateDetectionAndReadingRu",
     },
 }
 
+_LAZY_PIPELINES = {
+    task_options["impl"].split(":")[1]: task_options["impl"] for task_options in SUPPORTED_TASKS.values()
+}
+_LAZY_PIPELINES["Pipeline"] = "nomeroff_net.pipelines.base:Pipeline"
+
+
+def import_impl(impl: Union[str, type]) -> type:
+    """
+    import pipeline class from "module:class" string
+    """
+    if not isinstance(impl, str):
+        return impl
+    module_name, class_name = impl.split(":")
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def __getattr__(name: str) -> Any:
+    if name not in _LAZY_PIPELINES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = import_impl(_LAZY_PIPELINES[name])
+    globals()[name] = value
+    return value
+
 
 def check_task(task: str) -> Dict:
     """
@@ -101,7 +102,8 @@ def check_task(task: str) -> Dict:
         :Dict: Task options
     """
     if task in SUPPORTED_TASKS:
-        targeted_task = SUPPORTED_TASKS[task]
+        targeted_task = dict(SUPPORTED_TASKS[task])
+        targeted_task["impl"] = import_impl(targeted_task["impl"])
         return targeted_task
 
     raise KeyError(f"Unknown task {task}, available tasks are {SUPPORTED_TASKS.keys()}")
@@ -109,10 +111,10 @@ def check_task(task: str) -> Dict:
 
 def pipeline(
     task: str = None,
-    image_loader: Optional[Union[str, BaseImageLoader]] = None,
+    image_loader: Optional[Union[str, "BaseImageLoader"]] = None,
     pipeline_kwargs: Dict[str, Any] = None,
     **kwargs,
-) -> Pipeline:
+) -> "Pipeline":
     """
     Args:
         task (): pipelines name.
@@ -136,6 +138,7 @@ def pipeline(
         - [number_plate_detection_and_reading_runtime_v2](pipelines/number_plate_detection_and_reading_runtime_v2.md)
         - [number_plate_detection_and_reading](pipelines/number_plate_detection_and_reading.md)
         - [number_plate_detection_and_reading_runtime](pipelines/number_plate_detection_and_reading_runtime.md)
+        - [number_plate_detection_and_reading_ru](pipelines/number_plate_detection_and_reading_ru.md)
 
     Examples:
         >>> from nomeroff_net import pipeline
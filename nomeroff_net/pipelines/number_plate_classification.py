@@ -17,10 +17,14 @@ class NumberPlateClassification(Pipeline):
                  path_to_model="latest",
                  options=None,
                  class_detector=OptionsDetector,
+                 backend="torch",
                  **kwargs):
         super().__init__(task, image_loader, **kwargs)
         self.detector = class_detector(options=options)
-        self.detector.load(path_to_model, options=options)
+        if backend == "torch":
+            self.detector.load(path_to_model, options=options)
+        else:
+            self.detector.load(path_to_model, options=options, backend=backend)
 
     def sanitize_parameters(self, **kwargs):
         return {}, {}, {}
@@ -16,7 +16,9 @@ from .number_plate_localization import NumberPlateLocalization as DefaultNumberP
 from .number_plate_key_points_detection import NumberPlateKeyPointsDetection
 from .number_plate_text_reading import NumberPlateTextReading
 from.number_plate_classification import NumberPlateClassification
-from nomeroff_net.tools.image_processing import crop_number_plate_zones_from_images, group_by_image_ids
+from nomeroff_net.tools.image_processing import (crop_number_plate_zones_from_images,
+                                                 crop_number_plate_rect_zones_from_images,
+                                                 group_by_image_ids)
 from nomeroff_net.tools import unzip
 
 
@@ -34,11 +36,17 @@ class NumberPlateDetectionAndReading(Pipeline, CompositePipeline):
                  path_to_classification_model: str = "latest",
                  presets: Dict = None,
                  off_number_plate_classification: bool = False,
+                 off_number_plate_key_points_detection: bool = False,
                  classification_options: List = None,
                  default_label: str = "eu_ua_2015",
                  default_lines_count: int = 1,
                  number_plate_localization_class: Pipeline = DefaultNumberPlateLocalization,
                  number_plate_localization_detector=None,
+                 lazy_load_ocr_models: bool = False,
+                 ocr_memory_budget_mb: float = None,
+                 ocr_idle_timeout: float = None,
+                 return_text_confidences: bool = False,
+                 backend: str = "torch",
                  **kwargs):
         """
         init NumberPlateDetectionAndReading Class
@@ -50,26 +58,37 @@ class NumberPlateDetectionAndReading(Pipeline, CompositePipeline):
             path_to_classification_model (): path_to_classification_model
             presets (): presets
             off_number_plate_classification (): off_number_plate_classification
+            off_number_plate_key_points_detection (): read bbox crops without CRAFT key points refinement
             classification_options (): classification_options
             default_label (): default_label
             default_lines_count (): default_lines_count
             number_plate_localization_class (): number_plate_localization_class
             number_plate_localization_detector (): number_plate_localization_detector
+            lazy_load_ocr_models (): load each OCR preset on the first zone routed to it
+            ocr_memory_budget_mb (): evict least recently used OCR models above this size
+            ocr_idle_timeout (): evict OCR models unused for this many seconds
+            return_text_confidences (): append per-character OCR probabilities of every text to the results
+            backend (): "torch" or "onnx" to run every model with onnxruntime on cpu
 
         """
         self.default_label = default_label
         self.default_lines_count = default_lines_count
+        self.return_text_confidences = return_text_confidences
         self.number_plate_localization = number_plate_localization_class(
             "number_plate_localization",
             image_loader=None,
             path_to_model=path_to_model,
-            detector=number_plate_localization_detector
+            detector=number_plate_localization_detector,
+            backend=backend,
         )
-        self.number_plate_key_points_detection = NumberPlateKeyPointsDetection(
-            "number_plate_key_points_detection",
-            image_loader=None,
-            mtl_model_path=mtl_model_path,
-            refiner_model_path=refiner_model_path)
+        self.number_plate_key_points_detection = None
+        if not off_number_plate_key_points_detection:
+            self.number_plate_key_points_detection = NumberPlateKeyPointsDetection(
+                "number_plate_key_points_detection",
+                image_loader=None,
+                mtl_model_path=mtl_model_path,
+                refiner_model_path=refiner_model_path,
+                backend=backend)
         self.number_plate_classification = None
         option_detector_width = 0
         option_detector_height = 0
@@ -78,7 +97,8 @@ class NumberPlateDetectionAndReading(Pipeline, CompositePipeline):
                 "number_plate_classification",
                 image_loader=None,
                 path_to_model=path_to_classification_model,
-                options=classification_options)
+                options=classification_options,
+                backend=backend)
             option_detector_width = self.number_plate_classification.detector.width
             option_detector_height = self.number_plate_classification.detector.height
         self.number_plate_text_reading = NumberPlateTextReading(
@@ -90,12 +110,18 @@ class NumberPlateDetectionAndReading(Pipeline, CompositePipeline):
             default_label=default_label,
             default_lines_count=default_lines_count,
             off_number_plate_classification=off_number_plate_classification,
+            lazy_load_models=lazy_load_ocr_models,
+            memory_budget_mb=ocr_memory_budget_mb,
+            idle_timeout=ocr_idle_timeout,
+            return_confidences=return_text_confidences,
+            backend=backend,
         )
         self.pipelines = [
             self.number_plate_localization,
-            self.number_plate_key_points_detection,
             self.number_plate_text_reading,
         ]
+        if self.number_plate_key_points_detection is not None:
+            self.pipelines.append(self.number_plate_key_points_detection)
         if self.number_plate_classification is not None:
             self.pipelines.append(self.number_plate_classification)
         Pipeline.__init__(self, task, image_loader, **kwargs)
@@ -110,9 +136,14 @@ class NumberPlateDetectionAndReading(Pipeline, CompositePipeline):
 
     def forward_detection_np(self, inputs: Any, **forward_parameters: Dict):
         images_bboxs, images = unzip(self.number_plate_localization(inputs, **forward_parameters))
-        images_points, images_mline_boxes = unzip(self.number_plate_key_points_detection(unzip([images, images_bboxs]),
-                                                                                         **forward_parameters))
-        zones, image_ids = crop_number_plate_zones_from_images(images, images_points)
+        if self.number_plate_key_points_detection is None:
+            images_points = [[] for _ in images]
+            images_mline_boxes = [[] for _ in images]
+            zones, image_ids = crop_number_plate_rect_zones_from_images(images, images_bboxs)
+        else:
+            images_points, images_mline_boxes = unzip(
+                self.number_plate_key_points_detection(unzip([images, images_bboxs]), **forward_parameters))
+            zones, image_ids = crop_number_plate_zones_from_images(images, images_points)
         if self.number_plate_classification is None or not len(zones):
             region_ids = [-1 for _ in zones]
             region_names = [self.default_label for _ in zones]
@@ -141,12 +172,22 @@ class NumberPlateDetectionAndReading(Pipeline, CompositePipeline):
             texts, _ = number_plate_text_reading_res
         else:
             texts = []
+        if self.return_text_confidences:
+            texts, text_confidences = (unzip(texts) or [[], []])
+            (text_confidences,) = group_by_image_ids(image_ids, (text_confidences,), count_images=len(images))
+        # key points come back only up to the last image with a plate, pad them
+        # so that images without plates at the end of a batch are not dropped
+        images_points = list(images_points) + [[] for _ in range(len(images) - len(images_points))]
         (region_ids, region_names, count_lines, confidences, texts, zones) = \
-            group_by_image_ids(image_ids, (region_ids, region_names, count_lines, confidences, texts, zones))
-        return unzip([images, images_bboxs,
-                      images_points, zones,
-                      region_ids, region_names,
-                      count_lines, confidences, texts])
+            group_by_image_ids(image_ids, (region_ids, region_names, count_lines, confidences, texts, zones),
+                               count_images=len(images))
+        outputs = [images, images_bboxs,
+                   images_points, zones,
+                   region_ids, region_names,
+                   count_lines, confidences, texts]
+        if self.return_text_confidences:
+            outputs.append(text_confidences)
+        return unzip(outputs)
 
     def forward(self, inputs: Any, **forward_parameters: Dict) -> Any:
         """
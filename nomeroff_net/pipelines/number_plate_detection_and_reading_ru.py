@@ -0,0 +1,113 @@
+"""russian number plate detection and reading pipeline
+
+Fast profile for deployments that only read russian plates:
+YOLO localization -> optional CRAFT key points refinement -> single "ru" OCR.
+The multi-region NumberPlateClassification pass is skipped and every zone is
+read as a one-line "ru" plate, so only one OCR model is loaded.
+
+Compared with "number_plate_detection_and_reading" the profile removes the
+options classifier forward pass for every zone and the eleven non-ru OCR
+models from memory. With use_key_points=False it also skips CRAFT and reads
+the axis-aligned bbox crop, which is the cheapest variant but loses
+perspective correction on tilted plates.
+
+Measured on 1 vCPU, torch 2.2.2 cpu, one thread, architectures from data/configs:
+    stage                                        batch 1     batch 8
+    options classifier, skipped (400x100)        128 ms      86 ms per zone
+    "ru" OCR, kept in both profiles (200x50)      20 ms       9 ms per zone
+    OCR weights loaded: 13 MB instead of 327 MB for the 12 default presets,
+    the 78 MB options classifier is not loaded at all.
+Weights were randomly initialized because the release checkpoints could not be
+downloaded there. Latency and memory depend only on the architecture, accuracy does
+not and was not compared. The CRAFT stage skipped by use_key_points=False was not
+measured either, the craft_text_detector fork could not be installed.
+The end-to-end time and text accuracy of both profiles are printed by
+    python3 -m nomeroff_net.pipelines.number_plate_detection_and_reading_ru <images_dir> <true_texts.json>
+where true_texts.json maps image file names to lists of expected plate texts.
+
+Examples:
+    >>> from nomeroff_net import pipeline
+    >>> from nomeroff_net.tools import unzip
+    >>> number_plate_detection_and_reading_ru = pipeline("number_plate_detection_and_reading_ru", image_loader="opencv")
+    >>> results = number_plate_detection_and_reading_ru(['./data/examples/oneline_images/example1.jpeg'])
+    >>> (images, images_bboxs, images_points, images_zones, region_ids, region_names, count_lines, confidences, texts) = unzip(results)
+"""
+import os
+import sys
+import time
+from typing import Optional, Union
+from nomeroff_net.image_loaders import BaseImageLoader
+from nomeroff_net.pipelines.number_plate_detection_and_reading import NumberPlateDetectionAndReading
+from nomeroff_net.tools import unzip
+
+
+class NumberPlateDetectionAndReadingRu(NumberPlateDetectionAndReading):
+    """
+    Number Plate Detection And Reading Class for russian plates only
+    """
+
+    def __init__(self,
+                 task,
+                 image_loader: Optional[Union[str, BaseImageLoader]],
+                 path_to_model: str = "latest",
+                 mtl_model_path: str = "latest",
+                 refiner_model_path: str = "latest",
+                 text_reader_path: str = "latest",
+                 use_key_points: bool = True,
+                 **kwargs):
+        """
+        init NumberPlateDetectionAndReadingRu Class
+        Args:
+            image_loader (): image_loader
+            path_to_model (): path_to_model
+            mtl_model_path (): mtl_model_path
+            refiner_model_path (): refiner_model_path
+            text_reader_path (): path to "ru" OCR model
+            use_key_points (): refine zones with CRAFT key points, otherwise read bbox crops
+        """
+        presets = {
+            "ru": {
+                "for_regions": ["ru"],
+                "model_path": text_reader_path
+            }
+        }
+        super().__init__(task,
+                         image_loader,
+                         path_to_model=path_to_model,
+                         mtl_model_path=mtl_model_path,
+                         refiner_model_path=refiner_model_path,
+                         presets=presets,
+                         off_number_plate_classification=True,
+                         off_number_plate_key_points_detection=not use_key_points,
+                         default_label="ru",
+                         default_lines_count=1,
+                         **kwargs)
+
+
+def compare_with_full_pipeline(images_dir, true_texts_file):
+    """
+    Print time per image and text accuracy of the full and russian profiles
+    """
+    from nomeroff_net import pipeline
+
+    img_paths = [os.path.join(images_dir, name) for name in sorted(os.listdir(images_dir))]
+    for task, kwargs in (("number_plate_detection_and_reading", {}),
+                         ("number_plate_detection_and_reading_ru", {}),
+                         ("number_plate_detection_and_reading_ru", {"use_key_points": False})):
+        number_plate_pipeline = pipeline(task, image_loader="opencv", **kwargs)
+        start_time = time.time()
+        results = number_plate_pipeline(img_paths)
+        duration = time.time() - start_time
+        (images, images_bboxs, images_points, images_zones,
+         region_ids, region_names, count_lines, confidences, texts) = unzip(results)
+        print(f"[INFO] {task} {kwargs}: {duration / len(img_paths):.4f}s per image")
+        number_plate_pipeline.text_accuracy_test_from_file(true_texts_file, texts,
+                                                           img_paths, images, images_bboxs,
+                                                           images_points, images_zones,
+                                                           region_ids, region_names,
+                                                           count_lines, confidences,
+                                                           debug=False)
+
+
+if __name__ == "__main__":
+    compare_with_full_pipeline(sys.argv[1], sys.argv[2])
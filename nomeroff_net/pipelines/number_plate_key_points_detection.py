@@ -16,10 +16,11 @@ class NumberPlateKeyPointsDetection(Pipeline):
                  image_loader: Optional[Union[str, BaseImageLoader]],
                  mtl_model_path: str = "latest",
                  refiner_model_path: str = "latest",
+                 backend: str = "torch",
                  **kwargs):
         super().__init__(task, image_loader, **kwargs)
         self.detector = NpPointsCraft()
-        self.detector.load(mtl_model_path, refiner_model_path)
+        self.detector.load(mtl_model_path, refiner_model_path, backend=backend)
 
     def sanitize_parameters(self, quality_profile=None, **kwargs):
         forward_parameters = {}
@@ -17,12 +17,16 @@ class NumberPlateLocalization(Pipeline):
                  image_loader: Optional[Union[str, BaseImageLoader]],
                  path_to_model="latest",
                  detector=None,
+                 backend="torch",
                  **kwargs):
         super().__init__(task, image_loader, **kwargs)
         if detector is None:
             detector = Detector
         self.detector = detector()
-        self.detector.load(path_to_model)
+        if backend == "torch":
+            self.detector.load(path_to_model)
+        else:
+            self.detector.load(path_to_model, backend=backend)
 
     def sanitize_parameters(self, img_size=None, stride=None, min_accuracy=None, **kwargs):
         parameters = {}
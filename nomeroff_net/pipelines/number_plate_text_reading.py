@@ -72,14 +72,24 @@ class NumberPlateTextReading(Pipeline):
                  option_detector_width=0,
                  option_detector_height=0,
                  off_number_plate_classification=True,
+                 lazy_load_models=False,
+                 memory_budget_mb=None,
+                 idle_timeout=None,
+                 return_confidences=False,
+                 backend="torch",
                  **kwargs):
         if presets is None:
             presets = DEFAULT_PRESETS
+        self.return_confidences = return_confidences
         super().__init__(task, image_loader, **kwargs)
         self.detector = class_detector(presets, default_label, default_lines_count,
                                        option_detector_width=option_detector_width,
                                        option_detector_height=option_detector_height,
-                                       off_number_plate_classification=off_number_plate_classification)
+                                       off_number_plate_classification=off_number_plate_classification,
+                                       lazy_load_models=lazy_load_models,
+                                       memory_budget_mb=memory_budget_mb,
+                                       idle_timeout=idle_timeout,
+                                       backend=backend)
 
     def sanitize_parameters(self, **kwargs):
         return {}, {}, {}
@@ -98,7 +108,7 @@ class NumberPlateTextReading(Pipeline):
         preprocessed_np = [zone if pnp is None else pnp for pnp, zone in zip(preprocessed_np, images)]
         model_inputs = self.detector.preprocess(preprocessed_np, labels, lines)
         model_outputs = self.detector.forward(model_inputs)
-        model_outputs = self.detector.postprocess(model_outputs)
+        model_outputs = self.detector.postprocess(model_outputs, return_confidences=self.return_confidences)
         return unzip([images, model_outputs, labels])
 
     def postprocess(self, inputs: Any, **postprocess_parameters: Dict) -> Any:
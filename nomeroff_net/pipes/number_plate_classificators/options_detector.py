@@ -10,6 +10,7 @@ from pytorch_lightning.callbacks import ModelCheckpoint
 from pytorch_lightning.callbacks import LearningRateMonitor
 
 from nomeroff_net.tools.mcm import (modelhub, get_device_torch)
+from nomeroff_net.tools import torchscript_tools, onnx_tools, artifacts
 from nomeroff_net.data_modules.numberplate_options_data_module import OptionsNetDataModule
 from nomeroff_net.nnmodels.numberplate_options_model import NPOptionsNet
 from nomeroff_net.tools.image_processing import normalize_img, convert_cv_zones_rgb_to_bgr
@@ -90,6 +91,7 @@ class OptionsDetector(object):
         # model
         self.model = None
         self.trainer = None
+        self.path_to_model = None
 
         # data module
         self.dm = None
@@ -381,13 +383,56 @@ class OptionsDetector(object):
             self.width = model_info.get("width", self.width)
         return path_to_model
 
-    def load(self, path_to_model: str = "latest", options: Dict = None) -> NPOptionsNet:
+    def load(self, path_to_model: str = "latest", options: Dict = None, backend: str = "torch") -> NPOptionsNet:
         """
         TODO: describe method
         """
         path_to_model = self.load_meta(path_to_model, options)
-        self.create_model()
-        return self.load_model(path_to_model)
+        self.path_to_model = path_to_model
+        artifact = artifacts.resolve_artifact(path_to_model, backend)
+        if artifact.kind == artifacts.ONNX:
+            return self.load_onnx(path_to_model)
+        if artifact.kind == artifacts.CHECKPOINT:
+            self.create_model()
+            return self.load_model(path_to_model)
+        self.model = artifacts.load_scripted(artifact)
+        return self.model
+
+    def load_onnx(self, path_to_model: str) -> onnx_tools.OnnxModule:
+        """
+        Run the model with onnxruntime, the graph is exported next to the checkpoint on the first load
+        """
+        onnx_path = onnx_tools.get_onnx_path(path_to_model)
+        if not artifacts.is_fresh(onnx_path, path_to_model):
+            self.model = None
+            self.create_model()
+            model = self.load_model(path_to_model)
+            onnx_tools.export_onnx(model,
+                                   (torch.rand(1, self.color_channels, self.height, self.width),),
+                                   onnx_path,
+                                   input_names=["input"],
+                                   output_names=["region", "count_lines"],
+                                   dynamic_axes={"input": {0: "batch"},
+                                                 "region": {0: "batch"},
+                                                 "count_lines": {0: "batch"}})
+        self.model = onnx_tools.OnnxModule(onnx_path)
+        return self.model
+
+    def export_torchscript(self) -> str:
+        """
+        Save the loaded model as TorchScript with BatchNorm folded into convolutions
+        next to its checkpoint, the next load() picks it up
+        """
+        if isinstance(self.model, (torch.jit.ScriptModule, onnx_tools.OnnxModule)):
+            self.model = None
+            self.create_model()
+            self.load_model(self.path_to_model)
+        self.model.model = torchscript_tools.fuse_conv_bn(self.model.model)
+        script_path = torchscript_tools.get_script_path(self.path_to_model)
+        torchscript_tools.export_torchscript(self.model, (self.color_channels, self.height, self.width),
+                                             script_path)
+        self.model = self.model.to(device_torch)
+        return script_path
 
     def predict(self, imgs: List[np.ndarray], return_acc: bool = False) -> Tuple:
         """
@@ -1,12 +1,14 @@
-import os
 import cv2
 import torch
 import numpy as np
 import torch.backends.cudnn as cudnn
 from torch.autograd import Variable
+from collections import defaultdict
 from typing import List, Dict, Tuple, Any
 
 from nomeroff_net.tools.mcm import (modelhub, get_mode_torch)
+from nomeroff_net.tools import onnx_tools, artifacts
+from nomeroff_net.tools.pipeline_tools import chunked_iterable
 from nomeroff_net.tools.image_processing import (distance,
                                                  get_cv_zone_rgb,
                                                  crop_image,
@@ -33,6 +35,22 @@ from craft_text_detector.models.craftnet import CraftNet
 from craft_text_detector.models.refinenet import RefineNet
 
 
+class CraftRefineNet(torch.nn.Module):
+    """
+    CRAFT and LinkRefiner as one graph returning score and link maps
+    """
+
+    def __init__(self, net: CraftNet, refine_net: RefineNet) -> None:
+        super().__init__()
+        self.net = net
+        self.refine_net = refine_net
+
+    def forward(self, x: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+        y, feature = self.net(x)
+        y_refiner = self.refine_net(y, feature)
+        return y[:, :, :, 0], y_refiner[:, :, :, 0]
+
+
 class NpPointsCraft(object):
     """
     np_points_craft Class
@@ -44,6 +62,7 @@ class NpPointsCraft(object):
         self.is_poly = False
         self.net = None
         self.refine_net = None
+        self.onnx_net = None
 
     @classmethod
     def get_classname(cls: object) -> str:
@@ -51,7 +70,8 @@ class NpPointsCraft(object):
 
     def load(self,
              mtl_model_path: str = "latest",
-             refiner_model_path: str = "latest") -> None:
+             refiner_model_path: str = "latest",
+             backend: str = "torch") -> None:
         """
         TODO: describe method
         """
@@ -61,11 +81,35 @@ class NpPointsCraft(object):
         if refiner_model_path == "latest":
             model_info = modelhub.download_model_by_name("craft_refiner")
             refiner_model_path = model_info["path"]
+        # no int8 or TorchScript export exists for CRAFT, so it runs the onnx graph or the checkpoints
+        if artifacts.resolve_artifact(mtl_model_path, backend, (refiner_model_path,)).kind == artifacts.ONNX:
+            self.load_onnx(mtl_model_path, refiner_model_path)
+            return
         device = "cpu"
         if get_mode_torch() == "gpu":
             device = "cuda"
         self.load_model(device, True, mtl_model_path, refiner_model_path)
 
+    def load_onnx(self, mtl_model_path: str, refiner_model_path: str) -> None:
+        """
+        Run CRAFT + RefineNet with onnxruntime, the graph is exported next to the CRAFT checkpoint on the first load
+        """
+        onnx_path = onnx_tools.get_onnx_path(mtl_model_path)
+        if not artifacts.is_fresh(onnx_path, mtl_model_path, refiner_model_path):
+            self.load_model("cpu", True, mtl_model_path, refiner_model_path)
+            onnx_tools.export_onnx(CraftRefineNet(self.net, self.refine_net),
+                                   (torch.rand(1, 3, 96, 288),),
+                                   onnx_path,
+                                   input_names=["input"],
+                                   output_names=["score_text", "score_link"],
+                                   dynamic_axes={"input": {0: "batch", 2: "height", 3: "width"},
+                                                 "score_text": {0: "batch", 1: "height", 2: "width"},
+                                                 "score_link": {0: "batch", 1: "height", 2: "width"}})
+            self.net = self.refine_net = None
+        self.is_cuda = False
+        self.is_poly = True
+        self.onnx_net = onnx_tools.OnnxModule(onnx_path)
+
     def load_model(self,
                    device: str = "cuda",
                    is_refine: bool = True,
@@ -131,8 +175,20 @@ class NpPointsCraft(object):
         """
         TODO: describe function
         """
-        x = torch.from_numpy(x).permute(2, 0, 1)  # [h, w, c] to [c, h, w]
-        x = Variable(x.unsqueeze(0))  # [c, h, w] to [b, c, h, w]
+        score_texts, score_links = self.forward_stacked(x[np.newaxis])
+        return score_texts[0], score_links[0]
+
+    @torch.no_grad()
+    def forward_stacked(self, x: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Run CRAFT + RefineNet on a stack of equally shaped canvases [b, h, w, c]
+        and return score and link maps [b, h/2, w/2].
+        """
+        x = torch.from_numpy(x).permute(0, 3, 1, 2)  # [b, h, w, c] to [b, c, h, w]
+        if self.onnx_net is not None:
+            score_texts, score_links = self.onnx_net(x)
+            return score_texts.numpy(), score_links.numpy()
+        x = Variable(x)
         if self.is_cuda:
             x = x.cuda()
 
@@ -140,10 +196,10 @@ class NpPointsCraft(object):
         y_refiner = self.refine_net(y, feature)
 
         # make score and link map
-        score_text = y[0, :, :, 0].cpu().data.numpy()
-        score_link = y_refiner[0, :, :, 0].cpu().data.numpy()
+        score_texts = y[:, :, :, 0].cpu().data.numpy()
+        score_links = y_refiner[:, :, :, 0].cpu().data.numpy()
 
-        return score_text, score_link
+        return score_texts, score_links
 
     def detect(self,
                inputs,
@@ -159,8 +215,24 @@ class NpPointsCraft(object):
         return self.postprocess(model_outputs, quality_profile, text_threshold, link_threshold, low_text)
 
     @torch.no_grad()
-    def forward_batch(self, inputs: Any, **_) -> Any:
-        return [[*self.forward(x[0]), *x[1:]] for x in inputs]
+    def forward_batch(self, inputs: Any, craft_batch_size: int = 16, **_) -> Any:
+        """
+        Crops are bucketed by canvas shape (resize_aspect_ratio pads every crop
+        to a multiple of 32, so plates fall into a handful of shapes) and each
+        bucket goes through CRAFT as one tensor, which gives the same maps as
+        per-crop forwards without any extra padding.
+        """
+        buckets = defaultdict(list)
+        for idx, x in enumerate(inputs):
+            buckets[x[0].shape].append(idx)
+
+        outputs = [None] * len(inputs)
+        for idxs in buckets.values():
+            for chunk in chunked_iterable(idxs, craft_batch_size):
+                score_texts, score_links = self.forward_stacked(np.stack([inputs[idx][0] for idx in chunk]))
+                for idx, score_text, score_link in zip(chunk, score_texts, score_links):
+                    outputs[idx] = [score_text, score_link, *inputs[idx][1:]]
+        return outputs
 
     def preprocess(self, inputs: Any, canvas_size: int = 300, mag_ratio: float = 1.0, **_) -> Any:
         res = []
@@ -4,9 +4,17 @@ from typing import List
 
 from nomeroff_net.tools.mcm import (modelhub, get_device_torch)
 
-# download and append to path yolo repo
-info = modelhub.download_repo_for_model("yolov5")
-repo_path = info["repo_path"]
+_repo_path = None
+
+
+def get_repo_path() -> str:
+    """
+    download and append to path yolo repo on first use, not on import
+    """
+    global _repo_path
+    if _repo_path is None:
+        _repo_path = modelhub.download_repo_for_model("yolov5")["repo_path"]
+    return _repo_path
 
 
 class Detector(object):
@@ -26,7 +34,7 @@ class Detector(object):
 
     def load_model(self, weights: str, device: str = '') -> None:
         device = device or self.device
-        model = torch.hub.load(repo_path, 'custom', path=weights, source="local")
+        model = torch.hub.load(get_repo_path(), 'custom', path=weights, source="local")
         model.to(device)
         if device != 'cpu':  # half precision only supported on CUDA
             model.half()  # to FP16
@@ -3,6 +3,7 @@ import numpy as np
 from typing import List
 from nomeroff_net.pipes.number_plate_localizators.yolo_v5_detector import Detector as YoloDetector
 from nomeroff_net.tools.mcm import (modelhub, get_device_torch)
+from nomeroff_net.tools import onnx_tools, artifacts
 
 
 class Detector(YoloDetector):
@@ -26,14 +27,29 @@ class Detector(YoloDetector):
 
         device = device or self.device
         # model = torch.hub.load(repo_path, 'custom', path=weights, source="local")
-        model = YOLO(weights)
-        model.to(device)
+        model = YOLO(weights, task="detect")
+        if weights.endswith(onnx_tools.ONNX_SUFFIX):
+            # onnxruntime session runs on cpu
+            device = "cpu"
+        else:
+            model.to(device)
         # if device != 'cpu':  # half precision only supported on CUDA
         #     model.half()  # to FP16
         self.model = model
         self.device = device
 
-    def load(self, path_to_model: str = "latest") -> None:
+    @staticmethod
+    def export_onnx(path_to_model: str) -> str:
+        """
+        Export the checkpoint with dynamic input size next to it, ultralytics runs .onnx weights with onnxruntime
+        """
+        from ultralytics import YOLO
+
+        if not artifacts.is_fresh(onnx_tools.get_onnx_path(path_to_model), path_to_model):
+            YOLO(path_to_model).export(format="onnx", dynamic=True, opset=onnx_tools.ONNX_OPSET)
+        return onnx_tools.get_onnx_path(path_to_model)
+
+    def load(self, path_to_model: str = "latest", backend: str = "torch") -> None:
         if path_to_model == "latest":
             model_info = modelhub.download_model_by_name(self.yolo_model_type)
             path_to_model = model_info["path"]
@@ -46,6 +62,8 @@ class Detector(YoloDetector):
             model_info = modelhub.download_model_by_name(path_to_model)
             self.numberplate_classes = model_info.get("classes", self.numberplate_classes)
             path_to_model = model_info["path"]
+        if onnx_tools.check_backend(backend) == "onnx":
+            path_to_model = self.export_onnx(path_to_model)
         self.load_model(path_to_model)
 
     def convert_model_outputs_to_array(self, model_outputs):
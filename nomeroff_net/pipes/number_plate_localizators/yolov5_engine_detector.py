@@ -3,12 +3,7 @@ An example that uses TensorRT's Python api to make inferences.
 """
 import pycuda.autoinit
 import torch
-from nomeroff_net.tools.mcm import modelhub
-from nomeroff_net.pipes.number_plate_localizators.yolo_v5_detector import Detector as YoloDetector
-
-# download and append to path yolo repo
-info = modelhub.download_repo_for_model("yolov5")
-repo_path = info["repo_path"]
+from nomeroff_net.pipes.number_plate_localizators.yolo_v5_detector import Detector as YoloDetector, get_repo_path
 
 
 class Detector(YoloDetector):
@@ -20,4 +15,4 @@ class Detector(YoloDetector):
         self.model = None
 
     def load_model(self, weights: str, *args) -> None:
-        self.model = torch.hub.load(repo_path, 'custom',  path=weights, source="local")
+        self.model = torch.hub.load(get_repo_path(), 'custom',  path=weights, source="local")
@@ -21,10 +21,12 @@ from nomeroff_net.nnmodels.ocr_model import NPOcrNet, weights_init
 from nomeroff_net.tools.image_processing import normalize_img
 from nomeroff_net.tools.errors import OCRError
 from nomeroff_net.tools.mcm import modelhub, get_device_torch
+from nomeroff_net.tools import torchscript_tools, onnx_tools, artifacts
 from nomeroff_net.tools.augmentations import aug_seed
 from nomeroff_net.tools.ocr_tools import (StrLabelConverter,
                                           decode_prediction,
-                                          decode_batch)
+                                          decode_batch,
+                                          decode_batch_with_confidences)
 
 device_torch = get_device_torch()
 
@@ -251,11 +253,12 @@ class OCR(object):
     def forward(self, xs):
         return self.model(xs)
 
-    def postprocess(self, net_out_value):
-        net_out_value = [p.cpu().numpy() for p in net_out_value]
-        net_out_value_np = np.array(net_out_value)
-        pred_texts = decode_batch(torch.tensor(net_out_value_np, dtype=torch.float32), self.label_converter)
+    def postprocess(self, net_out_value, return_confidences=False):
+        pred_texts, confidences = decode_batch_with_confidences(torch.as_tensor(net_out_value, dtype=torch.float32),
+                                                                self.label_converter)
         pred_texts = [pred_text.upper() for pred_text in pred_texts]
+        if return_confidences:
+            return pred_texts, confidences
         return pred_texts
 
     @torch.no_grad()
@@ -339,13 +342,54 @@ class OCR(object):
         self.linear_size = model_info.get("linear_size", self.linear_size)
         return path_to_model
 
-    def load(self, path_to_model: str = "latest", nn_class=NPOcrNet) -> NPOcrNet:
+    def load(self, path_to_model: str = "latest", nn_class=NPOcrNet, backend: str = "torch") -> NPOcrNet:
         """
         TODO: describe method
         """
         path_to_model = self.load_meta(path_to_model)
-        self.create_model()
-        return self.load_model(path_to_model, nn_class=nn_class)
+        artifact = artifacts.resolve_artifact(path_to_model, backend)
+        if artifact.kind == artifacts.ONNX:
+            return self.load_onnx(path_to_model, nn_class=nn_class)
+        if artifact.kind == artifacts.CHECKPOINT:
+            self.create_model()
+            return self.load_model(path_to_model, nn_class=nn_class)
+        self.path_to_model = path_to_model
+        self.model = artifacts.load_scripted(artifact)
+        return self.model
+
+    def load_onnx(self, path_to_model: str, nn_class=NPOcrNet) -> onnx_tools.OnnxModule:
+        """
+        Run the model with onnxruntime, the graph is exported next to the checkpoint on the first load
+        """
+        self.path_to_model = path_to_model
+        onnx_path = onnx_tools.get_onnx_path(path_to_model)
+        if not artifacts.is_fresh(onnx_path, path_to_model):
+            self.create_model()
+            model = self.load_model(path_to_model, nn_class=nn_class)
+            onnx_tools.export_onnx(model,
+                                   (torch.rand(1, self.color_channels, self.height, self.width),),
+                                   onnx_path,
+                                   input_names=["input"],
+                                   output_names=["output"],
+                                   dynamic_axes={"input": {0: "batch"}, "output": {1: "batch"}})
+        self.model = onnx_tools.OnnxModule(onnx_path)
+        return self.model
+
+    def export_torchscript(self) -> str:
+        """
+        Save the loaded model as TorchScript with BatchNorm folded into convolutions
+        next to its checkpoint, the next load() picks it up
+        """
+        if isinstance(self.model, (torch.jit.ScriptModule, onnx_tools.OnnxModule)):
+            self.create_model()
+            self.load_model(self.path_to_model)
+        self.model.conv_nn = torchscript_tools.fuse_conv_bn(self.model.conv_nn)
+        script_path = torchscript_tools.get_script_path(self.path_to_model)
+        torchscript_tools.export_torchscript(self.model,
+                                             (self.color_channels, self.height, self.width),
+                                             script_path)
+        self.model = self.model.to(device_torch)
+        return script_path
 
     @torch.no_grad()
     def get_acc(self, predicted: List, decode: List) -> torch.Tensor:
@@ -0,0 +1,104 @@
+import time
+import threading
+from collections import OrderedDict
+from typing import Callable, List
+
+import torch
+
+
+def state_tensors(value) -> List:
+    if isinstance(value, torch.Tensor):
+        return [value]
+    if isinstance(value, (tuple, list)):
+        return [tensor for item in value for tensor in state_tensors(item)]
+    return []
+
+
+def get_model_size_mb(detector) -> float:
+    """
+    Approximate resident size of a loaded OCR model, artifacts loaded from a file
+    (TorchScript, int8, onnx) report their serialized size, other models their
+    state_dict tensors including quantized packed params.
+    """
+    model = getattr(detector, "model", None)
+    if model is None:
+        return 0.
+    if hasattr(model, "size_mb"):
+        return model.size_mb
+    tensors = [tensor for value in model.state_dict().values() for tensor in state_tensors(value)]
+    return sum(t.numel() * t.element_size() for t in tensors) / 1024 / 1024
+
+
+class LazyOcrRegistry(object):
+    """
+    List-like container of OCR detectors that loads a detector the first time
+    its index is requested and evicts least recently used detectors that have
+    been idle for `idle_timeout` seconds or do not fit into `memory_budget_mb`.
+    """
+
+    def __init__(self,
+                 loader: Callable,
+                 detectors_names: List[str],
+                 memory_budget_mb: float = None,
+                 idle_timeout: float = None) -> None:
+        self.loader = loader
+        self.detectors_names = detectors_names
+        self.memory_budget_mb = memory_budget_mb
+        self.idle_timeout = idle_timeout
+
+        self._loaded = OrderedDict()
+        self._sizes = {}
+        self._last_used = {}
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.detectors_names)
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
+
+    def __getitem__(self, idx: int):
+        idx = int(idx)
+        with self._lock:
+            if idx not in self._loaded:
+                detector = self.loader(self.detectors_names[idx])
+                self._loaded[idx] = detector
+                self._sizes[idx] = get_model_size_mb(detector)
+            self._loaded.move_to_end(idx)
+            self._last_used[idx] = time.monotonic()
+            self.evict(keep=idx)
+            return self._loaded[idx]
+
+    def __setitem__(self, idx: int, detector) -> None:
+        with self._lock:
+            self._loaded[int(idx)] = detector
+            self._sizes[int(idx)] = get_model_size_mb(detector)
+            self._last_used[int(idx)] = time.monotonic()
+
+    def is_loaded(self, idx: int) -> bool:
+        return int(idx) in self._loaded
+
+    def loaded_size_mb(self) -> float:
+        return sum(self._sizes[idx] for idx in self._loaded)
+
+    def unload(self, idx: int) -> None:
+        with self._lock:
+            self._loaded.pop(int(idx), None)
+            self._sizes.pop(int(idx), None)
+            self._last_used.pop(int(idx), None)
+
+    def evict(self, keep: int = None) -> None:
+        with self._lock:
+            now = time.monotonic()
+            if self.idle_timeout is not None:
+                for idx in list(self._loaded):
+                    if idx != keep and now - self._last_used[idx] > self.idle_timeout:
+                        self.unload(idx)
+            if self.memory_budget_mb is not None:
+                # OrderedDict keeps least recently used detectors first
+                for idx in list(self._loaded):
+                    if self.loaded_size_mb() <= self.memory_budget_mb:
+                        break
+                    if idx != keep:
+                        self.unload(idx)
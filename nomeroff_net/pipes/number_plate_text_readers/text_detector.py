@@ -5,6 +5,7 @@ import copy
 from typing import List, Dict, Tuple
 from torch import no_grad
 from .base.ocr import OCR
+from .lazy_registry import LazyOcrRegistry
 from nomeroff_net.tools.mcm import modelhub
 from nomeroff_net.tools.errors import TextDetectorError
 from nomeroff_net.tools.image_processing import convert_cv_zones_rgb_to_bgr
@@ -22,7 +23,11 @@ class TextDetector(object):
                  load_models=True,
                  option_detector_width=0,
                  option_detector_height=0,
-                 off_number_plate_classification=True) -> None:
+                 off_number_plate_classification=True,
+                 lazy_load_models=False,
+                 memory_budget_mb=None,
+                 idle_timeout=None,
+                 backend="torch") -> None:
         if presets is None:
             presets = {}
         self.presets = presets
@@ -37,6 +42,10 @@ class TextDetector(object):
         self.default_label = default_label
         self.default_lines_count = default_lines_count
         self.off_number_plate_classification = off_number_plate_classification
+        self.lazy_load_models = lazy_load_models
+        self.memory_budget_mb = memory_budget_mb
+        self.idle_timeout = idle_timeout
+        self.backend = backend
 
         i = 0
         for preset_name in self.presets:
@@ -56,18 +65,26 @@ class TextDetector(object):
         """
         TODO: support reloading
         """
+        if self.lazy_load_models:
+            self.detectors = LazyOcrRegistry(self.load_detector, self.detectors_names,
+                                             memory_budget_mb=self.memory_budget_mb,
+                                             idle_timeout=self.idle_timeout)
+            return
         self.detectors = []
-        for i, detector_name in enumerate(self.detectors_names):
-            model_conf = copy.deepcopy(modelhub.models[detector_name])
-            model_conf.update(self.presets[detector_name])
-            detector = OCR(model_name=detector_name, letters=model_conf["letters"],
-                           linear_size=model_conf["linear_size"], max_text_len=model_conf["max_text_len"],
-                           height=model_conf["height"], width=model_conf["width"],
-                           color_channels=model_conf["color_channels"],
-                           hidden_size=model_conf["hidden_size"], backbone=model_conf["backbone"])
-            detector.load(self.presets[detector_name]['model_path'])
-            detector.init_label_converter()
-            self.detectors.append(detector)
+        for detector_name in self.detectors_names:
+            self.detectors.append(self.load_detector(detector_name))
+
+    def load_detector(self, detector_name: str) -> OCR:
+        model_conf = copy.deepcopy(modelhub.models[detector_name])
+        model_conf.update(self.presets[detector_name])
+        detector = OCR(model_name=detector_name, letters=model_conf["letters"],
+                       linear_size=model_conf["linear_size"], max_text_len=model_conf["max_text_len"],
+                       height=model_conf["height"], width=model_conf["width"],
+                       color_channels=model_conf["color_channels"],
+                       hidden_size=model_conf["hidden_size"], backbone=model_conf["backbone"])
+        detector.load(self.presets[detector_name]['model_path'], backend=self.backend)
+        detector.init_label_converter()
+        return detector
 
     def define_predict_classes(self,
                                zones: List[np.ndarray],
@@ -134,10 +151,13 @@ class TextDetector(object):
             predicted[key]["ys"] = self.detectors[int(key)].forward(xs)
         return predicted
 
-    def postprocess(self, predicted):
+    def postprocess(self, predicted, return_confidences=False):
         res_all, order_all = [], []
         for key in predicted.keys():
-            predicted[key]["ys"] = self.detectors[int(key)].postprocess(predicted[key]["ys"])
+            predicted[key]["ys"] = self.detectors[int(key)].postprocess(predicted[key]["ys"],
+                                                                        return_confidences=return_confidences)
+            if return_confidences:
+                predicted[key]["ys"] = list(zip(*predicted[key]["ys"]))
             res_all = res_all + predicted[key]["ys"]
             order_all = order_all + predicted[key]["order"]
         return [x for _, x in sorted(zip(order_all, res_all), key=lambda pair: pair[0])]
@@ -0,0 +1,56 @@
+"""Inference artifacts exported next to a checkpoint
+
+OCR, the options classifier and CRAFT share one rule for what a loader runs:
+the onnx graph when backend="onnx", otherwise a fresh int8 artifact on cpu,
+then a fresh TorchScript artifact, then the checkpoint itself. An artifact is
+fresh while it is not older than any of the files it was exported from.
+"""
+import os
+from collections import namedtuple
+from typing import Tuple
+
+import torch
+
+from nomeroff_net.tools import onnx_tools, quantization_tools, torchscript_tools
+from nomeroff_net.tools.mcm import get_mode_torch, get_device_torch
+
+ONNX = "onnx"
+INT8 = "int8"
+TORCHSCRIPT = "torchscript"
+CHECKPOINT = "checkpoint"
+
+Artifact = namedtuple("Artifact", ["kind", "path"])
+
+
+def is_fresh(artifact_path: str, *sources: str) -> bool:
+    """
+    artifact exists and is not older than any of its existing sources
+    """
+    return (os.path.exists(artifact_path)
+            and all(not os.path.exists(source) or os.path.getmtime(artifact_path) >= os.path.getmtime(source)
+                    for source in sources))
+
+
+def resolve_artifact(path_to_model: str, backend: str = "torch", sources: Tuple[str, ...] = ()) -> Artifact:
+    """
+    pick what to load for a checkpoint, sources are other files the artifacts are exported from;
+    the onnx graph is returned even when stale, the loader exports it then
+    """
+    if onnx_tools.check_backend(backend) == "onnx":
+        return Artifact(ONNX, onnx_tools.get_onnx_path(path_to_model))
+    quantized_path = quantization_tools.get_quantized_path(path_to_model)
+    if (quantization_tools.use_quantized and get_mode_torch() == "cpu"
+            and is_fresh(quantized_path, path_to_model, *sources)):
+        return Artifact(INT8, quantized_path)
+    script_path = torchscript_tools.get_script_path(path_to_model)
+    if torchscript_tools.use_torchscript and is_fresh(script_path, path_to_model, *sources):
+        return Artifact(TORCHSCRIPT, script_path)
+    return Artifact(CHECKPOINT, path_to_model)
+
+
+def load_scripted(artifact: Artifact) -> torch.jit.ScriptModule:
+    """
+    int8 artifacts run on cpu only, TorchScript artifacts on the torch device
+    """
+    device = "cpu" if artifact.kind == INT8 else get_device_torch()
+    return torchscript_tools.load_torchscript(artifact.path, device)
@@ -1,6 +1,8 @@
 import os
-
-from modelhub_client import ModelHub
+import sys
+import json
+import threading
+from typing import Dict
 
 model_config_urls = [
     # numberplate classification
@@ -70,8 +72,172 @@ model_config_urls = [
 
 # initial
 local_storage = os.environ.get('LOCAL_STORAGE', os.path.join(os.path.dirname(__file__), "../../data"))
-modelhub = ModelHub(model_config_urls=model_config_urls,
-                    local_storage=local_storage)
+# strict offline mode: models, configs and repos are resolved only from the manifest in LOCAL_STORAGE
+offline_mode = os.environ.get('NOMEROFF_NET_OFFLINE', '').lower() in ("1", "true", "yes")
+MANIFEST_NAME = "modelhub_manifest.json"
+
+
+class ModelHubOfflineError(FileNotFoundError):
+    pass
+
+
+def get_manifest_path(storage: str = None) -> str:
+    return os.path.join(storage or local_storage, MANIFEST_NAME)
+
+
+def load_manifest(storage: str = None) -> Dict:
+    try:
+        with open(get_manifest_path(storage)) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        manifest = {}
+    for section in ("models", "files", "repos"):
+        manifest.setdefault(section, {})
+    return manifest
+
+
+def save_manifest(manifest: Dict, storage: str = None) -> None:
+    manifest_path = get_manifest_path(storage)
+    os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+    with open(manifest_path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+
+class RecordingModelHub(object):
+    """
+    Online ModelHub that writes every resolved model and repo into the manifest,
+    so that the next start can run with NOMEROFF_NET_OFFLINE=1
+    """
+    def __init__(self, storage: str) -> None:
+        from modelhub_client import ModelHub
+        self.local_storage = storage
+        self.hub = ModelHub(model_config_urls=model_config_urls, local_storage=storage)
+        self._lock = threading.Lock()
+        with self._lock:
+            manifest = load_manifest(storage)
+            manifest["models"] = self.hub.models
+            save_manifest(manifest, storage)
+
+    def __getattr__(self, name):
+        return getattr(self.hub, name)
+
+    def _record(self, section: str, key: str, info: Dict, path_key: str) -> Dict:
+        record = dict(info)
+        path = os.path.abspath(record[path_key])
+        storage = os.path.abspath(self.local_storage)
+        if os.path.commonpath([path, storage]) == storage:
+            record[path_key] = os.path.relpath(path, storage)
+        with self._lock:
+            manifest = load_manifest(self.local_storage)
+            manifest[section][key] = record
+            save_manifest(manifest, self.local_storage)
+        return info
+
+    def download_model_by_name(self, model_name: str, *args, **kwargs) -> Dict:
+        info = self.hub.download_model_by_name(model_name, *args, **kwargs)
+        return self._record("files", model_name, info, "path")
+
+    def download_model_by_url(self, url: str, *args, **kwargs) -> Dict:
+        info = self.hub.download_model_by_url(url, *args, **kwargs)
+        return self._record("files", url, info, "path")
+
+    def download_repo_for_model(self, model_name: str, *args, **kwargs) -> Dict:
+        info = self.hub.download_repo_for_model(model_name, *args, **kwargs)
+        return self._record("repos", model_name, info, "repo_path")
+
+
+class OfflineModelHub(object):
+    """
+    ModelHub replacement that never touches the network
+    """
+    def __init__(self, storage: str) -> None:
+        self.local_storage = storage
+        manifest = load_manifest(storage)
+        self.models = manifest["models"]
+        self.files = manifest["files"]
+        self.repos = manifest["repos"]
+
+    def _resolve(self, section: Dict, key: str, path_key: str) -> Dict:
+        if key not in section:
+            raise ModelHubOfflineError(f"{key} is not in {get_manifest_path(self.local_storage)}, "
+                                       f"download it once without NOMEROFF_NET_OFFLINE")
+        info = dict(section[key])
+        info[path_key] = os.path.join(self.local_storage, info[path_key])
+        if not os.path.exists(info[path_key]):
+            raise ModelHubOfflineError(f"{key} is missing in local storage: {info[path_key]}")
+        if "size" in info and os.path.isfile(info[path_key]) and os.path.getsize(info[path_key]) != info["size"]:
+            raise ModelHubOfflineError(f"{key} in local storage has unexpected size: {info[path_key]}")
+        return info
+
+    def download_model_by_name(self, model_name: str, *args, **kwargs) -> Dict:
+        info = dict(self.models.get(model_name, {}))
+        info.update(self._resolve(self.files, model_name, "path"))
+        return info
+
+    def download_model_by_url(self, url: str, *args, **kwargs) -> Dict:
+        return self._resolve(self.files, url, "path")
+
+    def download_repo_for_model(self, model_name: str, *args, **kwargs) -> Dict:
+        info = self._resolve(self.repos, model_name, "repo_path")
+        if info["repo_path"] not in sys.path:
+            sys.path.append(info["repo_path"])
+        return info
+
+
+class LazyModelHub(object):
+    """
+    Resolves models from the local manifest first and creates the online ModelHub
+    only on a miss, so importing nomeroff_net or building a pipeline from a
+    prefetched store does not probe the network
+    """
+    def __init__(self) -> None:
+        self._online = None
+        self._offline = None
+        self._lock = threading.Lock()
+
+    def offline(self) -> OfflineModelHub:
+        with self._lock:
+            if self._offline is None:
+                self._offline = OfflineModelHub(local_storage)
+            return self._offline
+
+    def online(self) -> RecordingModelHub:
+        if offline_mode:
+            raise ModelHubOfflineError("online ModelHub is disabled by NOMEROFF_NET_OFFLINE")
+        with self._lock:
+            if self._online is None:
+                self._online = RecordingModelHub(local_storage)
+            return self._online
+
+    @property
+    def models(self) -> Dict:
+        if self._online is None and (self.offline().models or offline_mode):
+            return self.offline().models
+        return self.online().models
+
+    def _download(self, method: str, name: str, *args, **kwargs) -> Dict:
+        try:
+            return getattr(self.offline(), method)(name, *args, **kwargs)
+        except ModelHubOfflineError:
+            if offline_mode:
+                raise
+        return getattr(self.online(), method)(name, *args, **kwargs)
+
+    def download_model_by_name(self, model_name: str, *args, **kwargs) -> Dict:
+        return self._download("download_model_by_name", model_name, *args, **kwargs)
+
+    def download_model_by_url(self, url: str, *args, **kwargs) -> Dict:
+        return self._download("download_model_by_url", url, *args, **kwargs)
+
+    def download_repo_for_model(self, model_name: str, *args, **kwargs) -> Dict:
+        return self._download("download_repo_for_model", model_name, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.online(), name)
+
+
+modelhub = LazyModelHub()
 
 
 def get_mode_torch() -> str:
@@ -0,0 +1,101 @@
+"""local model store
+
+Prefetches the models of a pipeline profile into LOCAL_STORAGE and writes
+modelhub_manifest.json with paths, sha256 checksums, sizes and model metadata,
+after that pipelines resolve models from the manifest without model hub requests.
+
+Examples:
+    python3 -m nomeroff_net.tools.model_store prefetch --profile number_plate_detection_and_reading_ru
+    python3 -m nomeroff_net.tools.model_store verify
+"""
+import os
+import sys
+import hashlib
+import argparse
+from typing import Dict, List
+
+from nomeroff_net.tools import mcm
+
+BASE_MODELS = ["yolov8", "craft_mlt", "craft_refiner"]
+METADATA_KEYS = ("letters", "height", "width", "color_channels", "max_text_len",
+                 "hidden_size", "backbone", "linear_size", "classes")
+
+
+def get_profile_models(profile: str) -> List[str]:
+    """
+    names of the models the profile loads with default arguments
+    """
+    if profile == "number_plate_detection_and_reading":
+        from nomeroff_net.pipelines.number_plate_text_reading import DEFAULT_PRESETS
+        return BASE_MODELS + ["numberplate_options"] + list(DEFAULT_PRESETS)
+    if profile == "number_plate_detection_and_reading_ru":
+        return BASE_MODELS + ["ru"]
+    raise KeyError(f"Unknown profile {profile}")
+
+
+def file_sha256(path: str, chunk_size: int = 1024 * 1024) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def prefetch(profile: str, storage: str = None) -> Dict:
+    storage = storage or mcm.local_storage
+    hub = mcm.RecordingModelHub(storage)
+    for model_name in get_profile_models(profile):
+        print(f"[INFO] fetch {model_name}")
+        hub.download_model_by_name(model_name)
+
+    manifest = mcm.load_manifest(storage)
+    for model_name in get_profile_models(profile):
+        record = manifest["files"][model_name]
+        path = os.path.join(storage, record["path"])
+        if os.path.isfile(path):
+            record["sha256"] = file_sha256(path)
+            record["size"] = os.path.getsize(path)
+        config = manifest["models"].get(model_name, {})
+        record.update({key: config[key] for key in METADATA_KEYS if key in config})
+    manifest.setdefault("profiles", {})[profile] = get_profile_models(profile)
+    mcm.save_manifest(manifest, storage)
+    return manifest
+
+
+def verify(storage: str = None) -> List[str]:
+    """
+    Returns names of the models whose files are missing or differ from the manifest checksum
+    """
+    storage = storage or mcm.local_storage
+    manifest = mcm.load_manifest(storage)
+    broken = []
+    for name, record in manifest["files"].items():
+        path = os.path.join(storage, record["path"])
+        if not os.path.exists(path) or ("sha256" in record and file_sha256(path) != record["sha256"]):
+            broken.append(name)
+    return broken
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="nomeroff_net local model store")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    prefetch_parser = subparsers.add_parser("prefetch", help="download profile models and write the manifest")
+    prefetch_parser.add_argument("--profile", default="number_plate_detection_and_reading")
+    prefetch_parser.add_argument("--storage", default=None)
+    verify_parser = subparsers.add_parser("verify", help="check model files against manifest checksums")
+    verify_parser.add_argument("--storage", default=None)
+    args = parser.parse_args(argv)
+
+    if args.command == "prefetch":
+        manifest = prefetch(args.profile, args.storage)
+        print(f"[INFO] {len(manifest['profiles'][args.profile])} models saved to "
+              f"{mcm.get_manifest_path(args.storage)}")
+        return 0
+    broken = verify(args.storage)
+    for name in broken:
+        print(f"[ERROR] {name} is missing or corrupted")
+    return 1 if broken else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
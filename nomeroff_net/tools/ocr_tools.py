@@ -3,7 +3,7 @@ import torch
 import numpy as np
 from numpy import mean
 from PIL import Image, ImageDraw
-from typing import List
+from typing import List, Tuple
 
 import collections
 
@@ -103,13 +103,43 @@ def decode_prediction(logits: torch.Tensor,
     return text
 
 
+def decode_batch_with_confidences(net_out_value: torch.Tensor,
+                                  label_converter: StrLabelConverter) -> Tuple[List[str], List[np.ndarray]]:
+    """
+    Greedy CTC decoding of the whole [T, B, C] output at once.
+    Returns texts and, for every decoded character, the highest softmax
+    probability over the frames it was collapsed from.
+    """
+    probs, tokens = net_out_value.detach().softmax(2).max(2)
+    tokens = tokens.t().cpu().numpy()  # [B, T]
+    probs = probs.t().cpu().numpy()
+    if not tokens.size:
+        return [], []
+
+    # a frame starts a new run when its token differs from the previous frame
+    run_starts = np.ones_like(tokens, dtype=bool)
+    run_starts[:, 1:] = tokens[:, 1:] != tokens[:, :-1]
+    keep = run_starts & (tokens != 0)
+
+    # max probability over each run, computed for all runs of all plates at once
+    flat_starts = np.flatnonzero(run_starts)
+    run_probs = np.maximum.reduceat(probs.ravel(), flat_starts)
+    run_keep = keep.ravel()[flat_starts]
+    run_rows = flat_starts // tokens.shape[1]
+
+    alphabet = np.array(list(label_converter.letters))
+    chars = alphabet[np.maximum(tokens[keep] - 1, 0)]
+    kept_rows = run_rows[run_keep]
+    bounds = np.searchsorted(kept_rows, np.arange(tokens.shape[0] + 1))
+
+    texts = ["".join(chars[bounds[i]:bounds[i + 1]]) for i in range(tokens.shape[0])]
+    confidences = np.split(run_probs[run_keep], bounds[1:-1])
+    return texts, confidences
+
+
 def decode_batch(net_out_value: torch.Tensor,
                  label_converter: StrLabelConverter) -> str or List:
-    texts = []
-    for i in range(net_out_value.shape[1]):
-        logits = net_out_value[:, i:i+1, :]
-        pred_texts = decode_prediction(logits, label_converter)
-        texts.append(pred_texts)
+    texts, _ = decode_batch_with_confidences(net_out_value, label_converter)
     return texts
 
 
@@ -0,0 +1,204 @@
+"""ONNX Runtime CPU backend
+
+Models are exported to <checkpoint>.onnx next to their checkpoints on the first
+load with backend="onnx" and executed by onnxruntime with all graph
+optimizations enabled. OnnxModule replaces the torch module of a detector, so
+preprocessing, decoding and postprocessing stay shared with the torch path.
+
+Check that both backends agree before switching a deployment. OCR, the options
+classifier and CRAFT are compared on the plate crops of data/dataset, the
+yolov8 localizer on the given images:
+    python3 -m nomeroff_net.tools.onnx_tools parity --ocr ru --options --craft \
+        --images ./data/dataset/Detector/autoria_numberplate_dataset_example/val/*.jpeg
+"""
+import os
+import sys
+import argparse
+from typing import List, Dict, Tuple, Union
+
+import numpy as np
+import torch
+
+BACKENDS = ("torch", "onnx")
+ONNX_SUFFIX = ".onnx"
+ONNX_OPSET = 17
+# 0 lets onnxruntime use every physical core
+ORT_NUM_THREADS = int(os.environ.get('NOMEROFF_NET_ORT_THREADS', '0'))
+PARITY_SPLITS = ("train", "val", "test")
+
+
+def check_backend(backend: str) -> str:
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend}, expected one of {BACKENDS}")
+    return backend
+
+
+def get_onnx_path(path_to_model: str) -> str:
+    return os.path.splitext(path_to_model)[0] + ONNX_SUFFIX
+
+
+def export_onnx(model: torch.nn.Module,
+                example_inputs: Tuple[torch.Tensor, ...],
+                path: str,
+                input_names: List[str],
+                output_names: List[str],
+                dynamic_axes: Dict[str, Dict[int, str]]) -> str:
+    """
+    export eval mode model on cpu to path
+    """
+    model = model.to("cpu").eval()
+    tmp_path = path + ".tmp"
+    with torch.no_grad():
+        torch.onnx.export(model, example_inputs, tmp_path,
+                          input_names=input_names,
+                          output_names=output_names,
+                          dynamic_axes=dynamic_axes,
+                          opset_version=ONNX_OPSET,
+                          do_constant_folding=True)
+    os.replace(tmp_path, path)
+    return path
+
+
+class OnnxModule(object):
+    """
+    Callable stand-in for an eval torch module backed by an onnxruntime CPU session,
+    takes and returns torch tensors
+    """
+
+    def __init__(self, path: str, num_threads: int = ORT_NUM_THREADS) -> None:
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.path = path
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_names = [item.name for item in self.session.get_inputs()]
+        self.size_mb = os.path.getsize(path) / 1024 / 1024
+
+    def __call__(self, *inputs: Union[torch.Tensor, np.ndarray]) -> Union[torch.Tensor, Tuple[torch.Tensor, ...]]:
+        feed = {}
+        for name, x in zip(self.input_names, inputs):
+            if isinstance(x, torch.Tensor):
+                x = x.detach().cpu().numpy()
+            feed[name] = np.ascontiguousarray(x, dtype=np.float32)
+        outputs = tuple(torch.from_numpy(output) for output in self.session.run(None, feed))
+        if len(outputs) == 1:
+            return outputs[0]
+        return outputs
+
+    def eval(self) -> "OnnxModule":
+        return self
+
+    def to(self, *_, **__) -> "OnnxModule":
+        return self
+
+
+def max_abs_diff(a: Union[torch.Tensor, Tuple], b: Union[torch.Tensor, Tuple]) -> float:
+    if isinstance(a, torch.Tensor):
+        a, b = (a,), (b,)
+    return max(float((x.detach().cpu() - y.detach().cpu()).abs().max()) for x, y in zip(a, b))
+
+
+def parity(ocr: List[str], options: bool = False, craft: bool = False, images: List[str] = None,
+           batch_size: int = 8, ocr_dataset: str = None, options_dataset: str = None) -> Dict[str, Dict]:
+    """
+    run torch and onnx backends of every model on the plate crops of the example datasets,
+    returns max absolute output difference and the share of equal decoded predictions,
+    the yolov8 localizer is compared on whole images
+    """
+    from nomeroff_net.pipes.number_plate_text_readers.text_detector import TextDetector
+    from nomeroff_net.pipes.number_plate_classificators.options_detector import OptionsDetector
+    from nomeroff_net.pipes.number_plate_keypoints_detectors.bbox_np_points import NpPointsCraft
+    from nomeroff_net.tools.pipeline_tools import chunked_iterable
+    from nomeroff_net.tools.quantization_tools import load_dataset, OCR_DATASET, OPTIONS_DATASET
+
+    ocr_crops, _ = load_dataset(ocr_dataset or OCR_DATASET, PARITY_SPLITS)
+    options_crops, _ = load_dataset(options_dataset or OPTIONS_DATASET, PARITY_SPLITS)
+    report = {}
+    for preset_name in ocr:
+        detectors = [TextDetector.get_static_module(preset_name) for _ in BACKENDS]
+        for detector, backend in zip(detectors, BACKENDS):
+            detector.load(backend=backend)
+        diffs, agreement = [], []
+        for chunk in chunked_iterable(ocr_crops, batch_size):
+            x = detectors[0].preprocess(chunk)
+            with torch.no_grad():
+                outputs = [detector.forward(x) for detector in detectors]
+            texts = [detector.postprocess(output) for detector, output in zip(detectors, outputs)]
+            diffs.append(max_abs_diff(*outputs))
+            agreement.extend(a == b for a, b in zip(*texts))
+        report[f"ocr {preset_name}"] = {"max_abs_diff": max(diffs), "agreement": np.mean(agreement)}
+    if options:
+        detectors = [OptionsDetector() for _ in BACKENDS]
+        for detector, backend in zip(detectors, BACKENDS):
+            detector.load(backend=backend)
+        diffs, agreement = [], []
+        for chunk in chunked_iterable(options_crops, batch_size):
+            x = detectors[0].preprocess(chunk)
+            with torch.no_grad():
+                outputs = [detector.forward(x) for detector in detectors]
+            predicted = [detector.unzip_predicted([p.cpu().numpy() for p in output])[1:]
+                         for detector, output in zip(detectors, outputs)]
+            diffs.append(max_abs_diff(*outputs))
+            agreement.extend(a == b for a, b in zip(zip(*predicted[0]), zip(*predicted[1])))
+        report["options"] = {"max_abs_diff": max(diffs), "agreement": np.mean(agreement)}
+    if craft:
+        detectors = [NpPointsCraft() for _ in BACKENDS]
+        for detector, backend in zip(detectors, BACKENDS):
+            detector.load(backend=backend)
+        # every crop is one target box covering the whole crop
+        inputs = detectors[0].preprocess([(crop, [[0, 0, crop.shape[1], crop.shape[0]]]) for crop in options_crops])
+        outputs = [detector.forward_batch(inputs, craft_batch_size=batch_size) for detector in detectors]
+        report["craft"] = {
+            "max_abs_diff": max(float(np.abs(a[k] - b[k]).max()) for a, b in zip(*outputs) for k in (0, 1)),
+            "agreement": np.mean([bool(((a[0] > 0.4) == (b[0] > 0.4)).all()) for a, b in zip(*outputs)]),
+        }
+    if images:
+        import cv2
+        from nomeroff_net.pipes.number_plate_localizators.yolo_v8_detector import Detector
+
+        imgs = [cv2.cvtColor(cv2.imread(path), cv2.COLOR_BGR2RGB) for path in images]
+        detectors = [Detector() for _ in BACKENDS]
+        for detector, backend in zip(detectors, BACKENDS):
+            detector.load(backend=backend)
+        outputs = [[np.array(bboxs).reshape(-1, 6) for bboxs in detector.predict(imgs)] for detector in detectors]
+        same_count = [len(a) == len(b) for a, b in zip(*outputs)]
+        report["yolov8"] = {
+            "max_abs_diff": max([float(np.abs(np.sort(a[:, :5], axis=0) - np.sort(b[:, :5], axis=0)).max())
+                                 for a, b, same in zip(*outputs, same_count) if same and len(a)] or [0.]),
+            "agreement": np.mean(same_count),
+        }
+    return report
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="nomeroff_net ONNX Runtime backend")
+    parser.add_argument("command", choices=["parity"])
+    parser.add_argument("--ocr", nargs="*", default=[], help="OCR preset names")
+    parser.add_argument("--options", action="store_true", help="numberplate options classifier")
+    parser.add_argument("--craft", action="store_true", help="CRAFT key points detector")
+    parser.add_argument("--images", nargs="*", default=[], help="images for the yolov8 localizer comparison")
+    parser.add_argument("--batch_size", type=int, default=8)
+    parser.add_argument("--ocr_dataset", default=None, help="OCR crops, the example dataset by default")
+    parser.add_argument("--options_dataset", default=None,
+                        help="options and CRAFT crops, the example dataset by default")
+    parser.add_argument("--tolerance", type=float, default=1e-3)
+    parser.add_argument("--bbox_tolerance", type=float, default=1., help="pixels")
+    args = parser.parse_args(argv)
+
+    report = parity(args.ocr, args.options, args.craft, args.images, args.batch_size,
+                    args.ocr_dataset, args.options_dataset)
+    failed = False
+    for name, res in report.items():
+        tolerance = args.bbox_tolerance if name == "yolov8" else args.tolerance
+        ok = res["max_abs_diff"] <= tolerance and res["agreement"] == 1
+        failed = failed or not ok
+        print(f"[{'INFO' if ok else 'ERROR'}] {name}: max abs diff {res['max_abs_diff']:.2e}, "
+              f"agreement {res['agreement']:.3f}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,201 @@
+"""INT8 quantization of OCR and numberplate options classifier for CPU inference
+
+dynamic: Linear and LSTM weights are stored in int8, activations are quantized on the fly.
+static: the convolutional backbone is additionally quantized with post-training
+calibration on plate crops (FX graph mode), the Linear/LSTM head stays dynamic.
+
+Quantized models are traced to TorchScript and saved as <checkpoint>.int8.pt,
+OCR.load and OptionsDetector.load prefer a fresh artifact when running on cpu.
+The workflow prints accuracy and time per image of fp32 and int8 models on the
+test split of the example datasets, calibration uses train and val splits.
+
+Latency measured on 1 vCPU, torch 2.2.2 cpu, fbgemm, one thread, on the example crops
+(fp32 checkpoint -> int8 artifact, batch 1 / batch 8 per image):
+    model                      dynamic                        static
+    ocr ru (resnet18)          19.8 / 9.5 -> 18.9 / 8.7ms     19.8 / 9.5 -> 6.3 / 3.5ms
+    options (efficientnet_v2)  128 / 86 -> 88 / 73ms          128 / 86 -> 73 / 60ms
+Only the static mode quantizes the convolutions that dominate both models.
+The weights were randomly initialized because the release checkpoints could not be
+downloaded there, so the accuracy deltas were not measured, run the workflow below
+with the release checkpoints and check its accuracy line before shipping an artifact.
+
+Examples:
+    python3 -m nomeroff_net.tools.quantization_tools --ocr ru eu --options --mode static
+"""
+import os
+import sys
+import copy
+import glob
+import json
+import time
+import argparse
+from typing import List, Dict, Tuple
+
+import numpy as np
+import torch
+
+from nomeroff_net.tools import torchscript_tools
+from nomeroff_net.tools.pipeline_tools import chunked_iterable
+
+# loaders prefer quantized artifacts on cpu, NOMEROFF_NET_QUANTIZED=0 switches back to fp32
+use_quantized = os.environ.get('NOMEROFF_NET_QUANTIZED', '1').lower() not in ("0", "false", "no")
+QUANTIZED_SUFFIX = ".int8.pt"
+QUANTIZATION_ENGINE = "fbgemm"
+QUANTIZATION_MODES = ("dynamic", "static")
+OCR_DATASET = os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                           "../../data/dataset/TextDetector/ocr_example"))
+OPTIONS_DATASET = os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                               "../../data/dataset/OptionsDetector/numberplate_options_example"))
+EVAL_BATCH_SIZE = 32
+
+
+def get_quantized_path(path_to_model: str) -> str:
+    return os.path.splitext(path_to_model)[0] + QUANTIZED_SUFFIX
+
+
+def load_dataset(path: str, splits: Tuple[str, ...]) -> Tuple[List[np.ndarray], List[Dict]]:
+    import cv2
+
+    images, anns = [], []
+    for split in splits:
+        for img_path in sorted(glob.glob(os.path.join(path, split, "img", "*.png"))):
+            name = os.path.splitext(os.path.basename(img_path))[0]
+            ann_path = os.path.join(path, split, "ann", f"{name}.json")
+            # unlabeled images are skipped as in ImgGenerator
+            if not os.path.exists(ann_path):
+                continue
+            with open(ann_path) as f:
+                anns.append(json.load(f))
+            images.append(cv2.imread(img_path))
+    return images, anns
+
+
+def quantize_dynamic(model: torch.nn.Module) -> torch.nn.Module:
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear, torch.nn.LSTM}, dtype=torch.qint8)
+
+
+def quantize_static(module: torch.nn.Module, batches: List[torch.Tensor]) -> torch.nn.Module:
+    """
+    post-training quantization of a convolutional backbone calibrated on batches
+    """
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+
+    prepared = prepare_fx(module.eval(), get_default_qconfig_mapping(QUANTIZATION_ENGINE), (batches[0],))
+    with torch.no_grad():
+        for batch in batches:
+            prepared(batch)
+    return convert_fx(prepared)
+
+
+def quantize_model(model: torch.nn.Module, backbone_attr: str,
+                   batches: List[torch.Tensor], mode: str = "static") -> torch.nn.Module:
+    torch.backends.quantized.engine = QUANTIZATION_ENGINE
+    model = copy.deepcopy(model).to("cpu").eval()
+    if mode == "static":
+        try:
+            setattr(model, backbone_attr, quantize_static(getattr(model, backbone_attr), batches))
+        except Exception as e:
+            print(f"[WARNING] static backbone quantization skipped: {e}")
+    return quantize_dynamic(model)
+
+
+def time_per_image(model, batches: List[torch.Tensor]) -> Tuple[float, List]:
+    with torch.no_grad():
+        model(batches[0])
+        start_time = time.time()
+        outputs = [model(batch) for batch in batches]
+    return (time.time() - start_time) / max(sum(len(batch) for batch in batches), 1), outputs
+
+
+def quantize_ocr(preset_name: str, mode: str = "static", dataset: str = OCR_DATASET) -> Dict:
+    from nomeroff_net.pipes.number_plate_text_readers.text_detector import TextDetector
+
+    detector = TextDetector.get_static_module(preset_name)
+    path_to_model = detector.load_meta("latest")
+    detector.create_model()
+    model = detector.load_model(path_to_model).to("cpu")
+
+    def to_batches(images):
+        return [detector.preprocess(chunk).cpu() for chunk in chunked_iterable(images, EVAL_BATCH_SIZE)]
+
+    calibration_images, _ = load_dataset(dataset, ("train", "val"))
+    test_images, anns = load_dataset(dataset, ("test",))
+    quantized = quantize_model(model, "conv_nn", to_batches(calibration_images), mode)
+    quantized_path = get_quantized_path(path_to_model)
+    torchscript_tools.export_torchscript(quantized,
+                                         (detector.color_channels, detector.height, detector.width),
+                                         quantized_path)
+
+    test_batches = to_batches(test_images)
+    report = {"path": quantized_path}
+    for precision, net in (("fp32", model), ("int8", torch.jit.load(quantized_path))):
+        seconds, outputs = time_per_image(net, test_batches)
+        texts = [text for output in outputs for text in detector.postprocess(output)]
+        report[precision] = {
+            "accuracy": np.mean([text.upper() == ann["description"].upper() for text, ann in zip(texts, anns)]),
+            "ms_per_image": seconds * 1000,
+        }
+    return report
+
+
+def quantize_options(mode: str = "static", dataset: str = OPTIONS_DATASET) -> Dict:
+    from nomeroff_net.pipes.number_plate_classificators.options_detector import OptionsDetector
+
+    detector = OptionsDetector()
+    path_to_model = detector.load_meta("latest")
+    detector.create_model()
+    model = detector.load_model(path_to_model).to("cpu")
+
+    def to_batches(images):
+        return [torch.tensor(detector.preprocess(chunk)) for chunk in chunked_iterable(images, EVAL_BATCH_SIZE)]
+
+    calibration_images, _ = load_dataset(dataset, ("train", "val"))
+    test_images, anns = load_dataset(dataset, ("test",))
+    quantized = quantize_model(model, "model", to_batches(calibration_images), mode)
+    quantized_path = get_quantized_path(path_to_model)
+    torchscript_tools.export_torchscript(quantized,
+                                         (detector.color_channels, detector.height, detector.width),
+                                         quantized_path)
+
+    test_batches = to_batches(test_images)
+    report = {"path": quantized_path}
+    for precision, net in (("fp32", model), ("int8", torch.jit.load(quantized_path))):
+        seconds, outputs = time_per_image(net, test_batches)
+        predicted = []
+        for output in outputs:
+            _, region_ids, count_lines = detector.unzip_predicted([p.numpy() for p in output])
+            region_ids = detector.custom_regions_id_to_all_regions(region_ids)
+            count_lines = detector.custom_count_lines_id_to_all_count_lines(count_lines)
+            predicted.extend(zip(region_ids, count_lines))
+        report[precision] = {
+            "accuracy": np.mean([(region_id, count_line) == (ann["region_id"], ann["count_lines"])
+                                 for (region_id, count_line), ann in zip(predicted, anns)]),
+            "ms_per_image": seconds * 1000,
+        }
+    return report
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="nomeroff_net INT8 quantization")
+    parser.add_argument("--ocr", nargs="*", default=[], help="OCR preset names")
+    parser.add_argument("--options", action="store_true", help="numberplate options classifier")
+    parser.add_argument("--mode", choices=QUANTIZATION_MODES, default="static")
+    parser.add_argument("--ocr_dataset", default=OCR_DATASET)
+    parser.add_argument("--options_dataset", default=OPTIONS_DATASET)
+    args = parser.parse_args(argv)
+
+    reports = {f"ocr {name}": quantize_ocr(name, args.mode, args.ocr_dataset) for name in args.ocr}
+    if args.options:
+        reports["options"] = quantize_options(args.mode, args.options_dataset)
+    for name, report in reports.items():
+        fp32, int8 = report["fp32"], report["int8"]
+        print(f"[INFO] {name} {args.mode}: accuracy {fp32['accuracy']:.4f} -> {int8['accuracy']:.4f} "
+              f"(delta {int8['accuracy'] - fp32['accuracy']:+.4f}), "
+              f"{fp32['ms_per_image']:.2f}ms -> {int8['ms_per_image']:.2f}ms per image, "
+              f"saved to {report['path']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+import asyncio
+import aiohttp
+from logger import setup_logger
+from db_worker import get_cached_phone_numbers, save_phone_numbers
+
+logger = setup_logger(__name__)
+
+PHONE_URL = "https://autokochka.ru/ajax/sale/getPhone/?sale_id={sale_id}"
+PHONE_LOOKUP_CONCURRENCY = 4
+PHONE_LOOKUP_RETRIES = 3
+PHONE_LOOKUP_BACKOFF = 1.0
+PHONE_CACHE_TTL = 24 * 60 * 60
+PHONE_LOOKUP_TIMEOUT = aiohttp.ClientTimeout(total=15)
+
+
+async def fetch_phone_number(session, semaphore, sale_id, retries=PHONE_LOOKUP_RETRIES,
+                             backoff=PHONE_LOOKUP_BACKOFF):
+    url = PHONE_URL.format(sale_id=sale_id)
+    for attempt in range(1, retries + 1):
+        try:
+            async with semaphore:
+                async with session.get(url) as response:
+                    if response.status == 200:
+                        data = await response.json(content_type=None)
+                        phone_data = data.get("data") if isinstance(data, dict) and data.get("ok") else None
+                        if isinstance(phone_data, dict):
+                            return phone_data.get("phone")
+                        logger.warning(f"Не удалось получить номер телефона для объявления {sale_id}")
+                        return None
+                    logger.error(f"Ошибка при получении телефонного номера с кодом ответа HTTP {response.status}")
+                    if response.status < 500 and response.status != 429:
+                        return None
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error(f"Ошибка при получении телефонного номера для объявления {sale_id}: {e}")
+        except ValueError as e:
+            # html page or captcha instead of json
+            logger.error(f"Некорректный ответ при получении телефонного номера для объявления {sale_id}: {e}")
+        if attempt < retries:
+            await asyncio.sleep(backoff * 2 ** (attempt - 1))
+    return None
+
+
+async def fetch_phone_numbers(sale_ids, concurrency=PHONE_LOOKUP_CONCURRENCY):
+    semaphore = asyncio.Semaphore(concurrency)
+    async with aiohttp.ClientSession(timeout=PHONE_LOOKUP_TIMEOUT) as session:
+        phones = await asyncio.gather(*(fetch_phone_number(session, semaphore, sale_id) for sale_id in sale_ids))
+    return dict(zip(sale_ids, phones))
+
+
+def get_phone_numbers(sale_ids, ttl_seconds=PHONE_CACHE_TTL):
+    sale_ids = [str(sale_id) for sale_id in dict.fromkeys(sale_ids)]
+    if not sale_ids:
+        return {}
+    phone_numbers = get_cached_phone_numbers(sale_ids, ttl_seconds)
+    missing_ids = [sale_id for sale_id in sale_ids if sale_id not in phone_numbers]
+    if missing_ids:
+        logger.debug(f"Запрос телефонных номеров для {len(missing_ids)} объявлений, "
+                     f"из кэша: {len(phone_numbers)}")
+        fetched = asyncio.run(fetch_phone_numbers(missing_ids))
+        save_phone_numbers({sale_id: phone for sale_id, phone in fetched.items() if phone})
+        phone_numbers.update(fetched)
+    return phone_numbers
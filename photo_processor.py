@@ -1,16 +1,33 @@
 import re
+import asyncio
+import atexit
+import threading
 from collections import Counter, defaultdict
-import tempfile
+import aiohttp
+import cv2
+import numpy as np
 from logger import setup_logger
-from nomeroff_net import pipeline
-from nomeroff_net.tools import unzip
-import requests
-from PIL import Image
-import io
-import os
+from metrics import timed, registry
+from recognition_worker import submit_images, load_recognition_pipeline, RecognitionBatcher, PlateReading, \
+    MODEL_VERSION
+from db_worker import get_cached_recognitions, save_recognitions
 
 logger = setup_logger(__name__)
 
+DOWNLOAD_CONCURRENCY = 8
+DOWNLOAD_TIMEOUT = aiohttp.ClientTimeout(total=60)
+STREAMING_CHUNK_SIZE = 4
+EARLY_EXIT_MIN_VOTES = 3
+EARLY_EXIT_MIN_AGREEMENT = 0.6
+PLATE_SERIES_LENGTH = 6
+PLATE_REGION_MAX_LENGTH = 3
+RECOGNITION_CACHE_MAX_ENTRIES = 50000
+
+_local_batcher = None
+_local_batcher_lock = threading.Lock()
+_image_downloader = None
+_image_downloader_lock = threading.Lock()
+
 
 def is_valid_russian_plate(number):
     pattern = re.compile(r'^[АВЕКМНОРСТУХABEKMHOPCTYX]\d{3}[АВЕКМНОРСТУХABEKMHOPCTYX]{2}\d{2,3}$')
@@ -35,83 +52,278 @@ def convert_number_to_cyrillic(number):
     return ''.join(translate_to_cyrillic(letter) for letter in number)
 
 
-def calculate_similarity(numbers):
-    similarity_scores = []
-    for i, number_i in enumerate(numbers):
-        score = 0
-        for j, number_j in enumerate(numbers):
-            if i != j:
-                score += sum(1 for a, b in zip(number_i, number_j) if a == b)
-        similarity_scores.append(score)
-    return similarity_scores
+def parse_plate_reading(reading):
+    """
+    Returns text, per-character weights of a reading from the worker or a bare text.
+    Character weight is the OCR probability of the character multiplied by the plate detection confidence.
+    """
+    if isinstance(reading, str):
+        return reading, [1.0] * len(reading)
+    text, char_confidences, detection_confidence = reading
+    if not text or len(char_confidences) != len(text):
+        char_confidences = [1.0] * len(text or "")
+    return text, [detection_confidence * confidence for confidence in char_confidences]
+
+
+class PlateConsensus:
+    """
+    Weighted per-position vote over plate readings, linear in the number of readings.
+    Series (letter, three digits, two letters) is voted position by position, region code
+    is aligned by its last digit so that "77" and "177" readings support the same digits,
+    its length (2 or 3) is voted separately.
+    """
+
+    def __init__(self):
+        self.series_stats = [defaultdict(float) for _ in range(PLATE_SERIES_LENGTH)]
+        self.region_stats = [defaultdict(float) for _ in range(PLATE_REGION_MAX_LENGTH)]
+        self.region_lengths = defaultdict(float)
+        self.numbers = Counter()
+        self.number_weights = defaultdict(float)
+        self.readings = []
+        self.total = 0
+        self.total_weight = 0.0
+
+    def add_reading(self, reading):
+        text, weights = parse_plate_reading(reading)
+        if not text or not is_valid_russian_plate(text):
+            return
+        self.add_number(convert_number_to_cyrillic(text), weights)
 
-def filter_outliers(numbers, similarity_scores):
-    average_score = sum(similarity_scores) / len(similarity_scores)
-    return [number for number, score in zip(numbers, similarity_scores) if score >= average_score * 0.5]
+    def add_number(self, number, weights):
+        for position in range(PLATE_SERIES_LENGTH):
+            self.series_stats[position][number[position]] += weights[position]
+        region_weights = weights[PLATE_SERIES_LENGTH:]
+        for offset, (symbol, weight) in enumerate(zip(reversed(number[PLATE_SERIES_LENGTH:]),
+                                                      reversed(region_weights))):
+            self.region_stats[offset][symbol] += weight
+        self.region_lengths[len(region_weights)] += sum(region_weights) / len(region_weights)
+        weight = sum(weights) / len(weights)
+        self.numbers[number] += 1
+        self.number_weights[number] += weight
+        self.readings.append((number, weights))
+        self.total += 1
+        self.total_weight += weight
 
-def aggregate_symbol_statistics(recognized_numbers):
-    symbol_stats = defaultdict(lambda: Counter())
-    for number in recognized_numbers:
-        for position, symbol in enumerate(number):
-            symbol_stats[position][symbol] += 1
-    return symbol_stats
+    def add(self, image_readings):
+        for reading in image_readings:
+            self.add_reading(reading)
+
+    def leader(self):
+        if not self.total:
+            return None, 0.0
+        region_length = max(self.region_lengths, key=self.region_lengths.get)
+        series = "".join(max(stats, key=stats.get) for stats in self.series_stats)
+        region = "".join(max(self.region_stats[offset], key=self.region_stats[offset].get)
+                         for offset in reversed(range(region_length)))
+        number = series + region
+        if self.total_weight > 0:
+            return number, self.number_weights[number] / self.total_weight
+        return number, self.numbers[number] / self.total
+
+    def without_outliers(self):
+        """
+        Consensus rebuilt from readings that match the leader in at least half of the series positions.
+        """
+        number, _ = self.leader()
+        consensus = PlateConsensus()
+        for reading_number, weights in self.readings:
+            matches = sum(1 for a, b in zip(reading_number[:PLATE_SERIES_LENGTH], number) if a == b)
+            if matches * 2 >= PLATE_SERIES_LENGTH:
+                consensus.add_number(reading_number, weights)
+        return consensus if consensus.total else self
 
 
 def find_most_common_number(recognized_texts):
-    recognized_numbers = [num for sublist in recognized_texts for num in sublist if num and is_valid_russian_plate(num)]
+    consensus = PlateConsensus()
+    for image_readings in recognized_texts:
+        consensus.add(image_readings)
 
-    if not recognized_numbers:
+    if not consensus.total:
         return None
 
-    similarity_scores = calculate_similarity(recognized_numbers)
-    recognized_numbers = filter_outliers(recognized_numbers, similarity_scores)
+    most_common_number, agreement = consensus.without_outliers().leader()
+    logger.debug(f"Итоговый номер {most_common_number} по {consensus.total} распознаваниям "
+                 f"(взвешенное согласие {agreement:.2f}).")
+    return most_common_number
+
+
+class StreamingPlateVote(PlateConsensus):
+    def __init__(self, min_votes=EARLY_EXIT_MIN_VOTES, min_agreement=EARLY_EXIT_MIN_AGREEMENT):
+        super().__init__()
+        self.min_votes = min_votes
+        self.min_agreement = min_agreement
+
+    def is_confident(self):
+        number, agreement = self.leader()
+        return number is not None and self.numbers[number] >= self.min_votes and agreement >= self.min_agreement
+
 
-    symbol_stats = aggregate_symbol_statistics(recognized_numbers)
+def recognize_ad_number_plates(image_urls, chunk_size=STREAMING_CHUNK_SIZE,
+                               min_votes=EARLY_EXIT_MIN_VOTES, min_agreement=EARLY_EXIT_MIN_AGREEMENT):
+    vote = StreamingPlateVote(min_votes, min_agreement)
+    recognized_texts = []
+    for start in range(0, len(image_urls), chunk_size):
+        chunk_texts = recognize_image_urls(image_urls[start:start + chunk_size])
+        for image_readings in chunk_texts:
+            vote.add(image_readings)
+        recognized_texts.extend(chunk_texts)
+        processed = min(start + chunk_size, len(image_urls))
+        if vote.is_confident() and processed < len(image_urls):
+            number, agreement = vote.leader()
+            logger.info(f"Номер {number} определён по {processed} из {len(image_urls)} изображений "
+                        f"(согласие {agreement:.2f}), остальные изображения пропущены.")
+            registry.inc('images_skipped', len(image_urls) - processed)
+            break
+    return recognized_texts
 
-    most_common_number = ""
-    for position in sorted(symbol_stats.keys()):
-        most_common_symbol, _ = symbol_stats[position].most_common(1)[0]
-        most_common_number += most_common_symbol
 
-    return convert_number_to_cyrillic(most_common_number)
+def image_content_hash(image):
+    """
+    Difference hash of the photo, survives re-encoding of reposted photos.
+    """
+    gray = cv2.cvtColor(np.ascontiguousarray(image), cv2.COLOR_RGB2GRAY)
+    gray = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    return np.packbits(gray[:, 1:] > gray[:, :-1]).tobytes().hex()
 
 
-def download_and_save_images(image_urls):
-    temp_images_paths = []
-    for url in image_urls:
+def image_size(image):
+    return f"{image.shape[1]}x{image.shape[0]}"
+
+
+def recognize_image_urls(image_urls, max_entries=RECOGNITION_CACHE_MAX_ENTRIES, model_version=MODEL_VERSION):
+    cached_by_url, _ = get_cached_recognitions(model_version, image_urls=image_urls)
+    recognized = dict(cached_by_url)
+
+    downloaded = download_images([url for url in image_urls if url not in recognized], with_urls=True)
+    # dHash collides for different photos, a hit is confirmed by the size of the decoded image
+    keys = {url: (image_content_hash(image), image_size(image)) for url, image in downloaded}
+    _, cached_by_hash = get_cached_recognitions(model_version, content_hashes={key[0] for key in keys.values()})
+
+    new_recognitions = {}
+    for url, image in downloaded:
+        if keys[url] in cached_by_hash:
+            recognized[url] = cached_by_hash[keys[url]]
+            new_recognitions[url] = (*keys[url], recognized[url])
+    registry.inc('recognition_cache_hits', len(recognized))
+
+    to_recognize = [(url, image) for url, image in downloaded if url not in recognized]
+    texts = recognize_number_plates([image for _, image in to_recognize]) if to_recognize else []
+    if to_recognize and len(texts) == len(to_recognize):
+        for (url, _), readings in zip(to_recognize, texts):
+            recognized[url] = readings
+            new_recognitions[url] = (*keys[url], readings)
+    if new_recognitions:
+        save_recognitions(new_recognitions, model_version, max_entries)
+
+    return [[reading if isinstance(reading, PlateReading) else PlateReading(*reading)
+             for reading in recognized[url]]
+            for url in image_urls if url in recognized]
+
+
+async def fetch_image(session, semaphore, url):
+    async with semaphore:
         try:
-            response = requests.get(url)
-            if response.status_code == 200:
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".png") as tmp:
-                    image = Image.open(io.BytesIO(response.content))
-                    image.save(tmp.name, "PNG")
-                    temp_images_paths.append(tmp.name)
-                    logger.debug(f"Изображение сохранено: {tmp.name}")
-            else:
-                logger.error(f"Ошибка HTTP {response.status_code} при скачивании изображения {url}.")
+            async with session.get(url) as response:
+                if response.status != 200:
+                    logger.error(f"Ошибка HTTP {response.status} при скачивании изображения {url}.")
+                    return None
+                content = await response.read()
         except Exception as e:
-            logger.error(f"Ошибка при скачивании или сохранении изображения {url}: {e}")
-    return temp_images_paths
+            logger.error(f"Ошибка при скачивании изображения {url}: {e}")
+            return None
+    try:
+        image = await asyncio.get_running_loop().run_in_executor(None, decode_image, content)
+    except Exception as e:
+        logger.error(f"Ошибка при декодировании изображения {url}: {e}")
+        return None
+    logger.debug(f"Изображение загружено: {url}")
+    return image
 
 
-def recognize_number_plates(image_paths):
-    if not image_paths:
-        logger.info("Список путей к изображениям пуст.")
+def decode_image(content):
+    image = cv2.imdecode(np.frombuffer(content, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError("неподдерживаемый формат изображения")
+    return image[..., ::-1]
+
+
+class ImageDownloader:
+    """
+    Event loop thread with one aiohttp session for the whole process,
+    chunks of an ad and concurrently processed ads reuse its keep-alive connections.
+    """
+
+    def __init__(self, max_concurrency=DOWNLOAD_CONCURRENCY):
+        self.max_concurrency = max_concurrency
+        self._session = None
+        self._semaphore = None
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, daemon=True).start()
+
+    async def _download(self, image_urls):
+        if self._session is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.max_concurrency),
+                                                  timeout=DOWNLOAD_TIMEOUT)
+        return await asyncio.gather(*(fetch_image(self._session, self._semaphore, url) for url in image_urls))
+
+    def download(self, image_urls):
+        return asyncio.run_coroutine_threadsafe(self._download(image_urls), self._loop).result()
+
+    def close(self):
+        if self._session is not None:
+            asyncio.run_coroutine_threadsafe(self._session.close(), self._loop).result()
+            self._session = None
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+def get_image_downloader():
+    global _image_downloader
+    with _image_downloader_lock:
+        if _image_downloader is None:
+            _image_downloader = ImageDownloader()
+            atexit.register(_image_downloader.close)
+    return _image_downloader
+
+
+def download_images(image_urls, with_urls=False):
+    if not image_urls:
+        return []
+    with timed('image_download'):
+        images = get_image_downloader().download(image_urls)
+    downloaded = [(url, image) for url, image in zip(image_urls, images) if image is not None]
+    registry.inc('images_downloaded', len(downloaded))
+    if with_urls:
+        return downloaded
+    return [image for _, image in downloaded]
+
+
+def recognize_number_plates(images):
+    if not images:
+        logger.info("Список изображений пуст.")
         return []
     try:
-        number_plate_detection_and_reading = pipeline("number_plate_detection_and_reading", image_loader="opencv")
-        _, _, _, _, _, _, _, _, texts = unzip(number_plate_detection_and_reading(image_paths))
+        texts = submit_images(images)
         logger.debug(f"Распознанные номера: {texts}")
         return texts
+    except (ConnectionError, EOFError) as e:
+        logger.warning(f"Воркер распознавания недоступен ({e}), распознавание выполняется в текущем процессе.")
     except Exception as e:
         logger.error(f"Ошибка при распознавании номеров: {e}")
         return []
+    return recognize_number_plates_locally(images)
 
 
-def cleanup_temp_images(image_paths):
-    for path in image_paths:
-        try:
-            os.remove(path)
-            logger.debug(f"Временное изображение удалено: {path}")
-        except Exception as e:
-            logger.error(f"Ошибка при удалении изображения {path}: {e}")
+def recognize_number_plates_locally(images):
+    global _local_batcher
+    try:
+        with _local_batcher_lock:
+            if _local_batcher is None:
+                _local_batcher = RecognitionBatcher(load_recognition_pipeline())
+        texts = _local_batcher.recognize(images)
+        logger.debug(f"Распознанные номера: {texts}")
+        return texts
+    except Exception as e:
+        logger.error(f"Ошибка при распознавании номеров: {e}")
+        return []
+
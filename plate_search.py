@@ -0,0 +1,90 @@
+"""
+Candidate keys and distance for approximate plate search.
+
+Plates come from OCR, so symbols of the same class that look alike (0/8, 1/7,
+В/Р, ...) are folded into one symbol before indexing. Each folded plate is
+stored under itself and every variant with one character deleted, so two plates
+that differ by any number of confusions plus one insertion, deletion or
+substitution share a key and are found with an indexed IN lookup. Candidates
+are ranked with a Levenshtein distance where a confusion costs less than an
+arbitrary edit. The cutoff of 1 allows one arbitrary edit or two confusions,
+every such plate shares a key with the query, plates two arbitrary edits
+away don't and are not searched for.
+
+Letter/digit lookalikes (О/0, В/8, ...) can't differ between two valid plates
+because the L-DDD-LL-DD(D) layout fixes the class of every position, so they
+are repaired in the query with fit_plate_layout instead.
+"""
+CONFUSABLE_GROUPS = ('08', '38', '17', '56', 'ВР', 'НМ', 'КХ')
+CONFUSION_COST = 0.5
+FUZZY_MAX_DISTANCE = 1
+# stored search keys are rebuilt when the version changes, bump it with the groups or plate_search_keys
+SEARCH_KEYS_VERSION = 2
+
+PLATE_LAYOUT = 'LDDDLLDDD'
+DIGIT_LOOKALIKES = {'О': '0', 'В': '8', 'Т': '7', 'А': '4', 'З': '3', 'Б': '6'}
+LETTER_LOOKALIKES = {'0': 'О', '8': 'В', '7': 'Т', '4': 'А'}
+
+
+def confusable_components(groups):
+    components = []
+    for group in groups:
+        merged = set(group)
+        for component in [component for component in components if component & merged]:
+            components.remove(component)
+            merged |= component
+        components.append(merged)
+    return components
+
+
+PLATE_FOLDING = str.maketrans({symbol: min(component)
+                               for component in confusable_components(CONFUSABLE_GROUPS) for symbol in component})
+CONFUSABLE_PAIRS = {(a, b) for group in CONFUSABLE_GROUPS for a in group for b in group if a != b}
+
+
+def fit_plate_layout(number):
+    """
+    Replace digits at letter positions and letters at digit positions with their lookalikes.
+    """
+    symbols = []
+    for symbol, kind in zip(number, PLATE_LAYOUT):
+        if kind == 'L' and symbol.isdigit():
+            symbol = LETTER_LOOKALIKES.get(symbol, symbol)
+        elif kind == 'D' and not symbol.isdigit():
+            symbol = DIGIT_LOOKALIKES.get(symbol, symbol)
+        symbols.append(symbol)
+    return ''.join(symbols) + number[len(PLATE_LAYOUT):]
+
+
+def fold_plate(number):
+    return number.translate(PLATE_FOLDING)
+
+
+def plate_search_keys(number):
+    folded = fold_plate(number)
+    return {folded} | {folded[:position] + folded[position + 1:] for position in range(len(folded))}
+
+
+def substitution_cost(a, b):
+    if a == b:
+        return 0
+    if (a, b) in CONFUSABLE_PAIRS:
+        return CONFUSION_COST
+    return 1
+
+
+def plate_distance(number, other):
+    previous = [float(j) for j in range(len(other) + 1)]
+    for i, a in enumerate(number, 1):
+        current = [float(i)]
+        for j, b in enumerate(other, 1):
+            current.append(min(previous[j] + 1,
+                               current[j - 1] + 1,
+                               previous[j - 1] + substitution_cost(a, b)))
+        previous = current
+    return previous[-1]
+
+
+def rank_candidates(number, candidates, max_distance=FUZZY_MAX_DISTANCE):
+    ranked = ((plate_distance(number, candidate), candidate) for candidate in candidates)
+    return sorted((distance, candidate) for distance, candidate in ranked if distance <= max_distance)
@@ -0,0 +1,182 @@
+import os
+import queue
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import Future
+from multiprocessing.connection import Listener, Client
+from logger import setup_logger
+from metrics import timed_call, registry, start_metrics_pusher
+
+logger = setup_logger(__name__)
+
+WORKER_HOST = os.getenv('RECOGNITION_WORKER_HOST', '127.0.0.1')
+WORKER_PORT = int(os.getenv('RECOGNITION_WORKER_PORT', '8001'))
+# the worker unpickles whatever a client sends, so the key is a secret without a default
+WORKER_AUTHKEY = os.getenv('RECOGNITION_WORKER_AUTHKEY', '').encode()
+# "number_plate_detection_and_reading_ru" is the russian-only fast profile
+WORKER_TASK = os.getenv('RECOGNITION_TASK', "number_plate_detection_and_reading")
+MAX_BATCH_IMAGES = int(os.getenv('RECOGNITION_MAX_BATCH_IMAGES', '32'))
+MAX_BATCH_WAIT = float(os.getenv('RECOGNITION_MAX_BATCH_WAIT', '0.2'))
+PIPELINE_BATCH_SIZE = int(os.getenv('RECOGNITION_PIPELINE_BATCH_SIZE', '8'))
+OCR_MEMORY_BUDGET_MB = float(os.getenv('RECOGNITION_OCR_MEMORY_BUDGET_MB', '0')) or None
+OCR_IDLE_TIMEOUT = float(os.getenv('RECOGNITION_OCR_IDLE_TIMEOUT', '3600')) or None
+# "onnx" runs localization, key points, classification and OCR with onnxruntime on cpu
+INFERENCE_BACKEND = os.getenv('RECOGNITION_BACKEND', 'torch')
+# readings of other models are not reused from the recognition cache
+MODEL_VERSION = f"{WORKER_TASK}:{INFERENCE_BACKEND}"
+
+
+PIPELINE_STAGES = {
+    'number_plate_localization': 'localization',
+    'number_plate_key_points_detection': 'key_points',
+    'number_plate_classification': 'classification',
+    'number_plate_text_reading': 'ocr',
+}
+
+# text of a plate with OCR probability of every character and YOLO confidence of its bbox
+PlateReading = namedtuple('PlateReading', ['text', 'char_confidences', 'detection_confidence'])
+
+
+def load_recognition_pipeline(task=WORKER_TASK):
+    from nomeroff_net import pipeline
+    logger.info(f"Загрузка моделей для задачи {task}, бэкенд {INFERENCE_BACKEND}.")
+    return instrument_pipeline(pipeline(task, image_loader=None,
+                                        lazy_load_ocr_models=True,
+                                        ocr_memory_budget_mb=OCR_MEMORY_BUDGET_MB,
+                                        ocr_idle_timeout=OCR_IDLE_TIMEOUT,
+                                        return_text_confidences=True,
+                                        backend=INFERENCE_BACKEND))
+
+
+def instrument_pipeline(number_plate_detection_and_reading):
+    for attr, stage in PIPELINE_STAGES.items():
+        sub_pipeline = getattr(number_plate_detection_and_reading, attr, None)
+        if sub_pipeline is not None:
+            sub_pipeline.call = timed_call(stage, sub_pipeline.call)
+    return number_plate_detection_and_reading
+
+
+def run_recognition(number_plate_detection_and_reading, images, batch_size=1):
+    from nomeroff_net.tools import unzip
+    if not images:
+        return []
+    results = unzip(number_plate_detection_and_reading(images, batch_size=batch_size))
+    images_bboxs, texts, text_confidences = results[1], results[8], results[9]
+    readings = []
+    for image_bboxs, image_texts, image_text_confidences in zip(images_bboxs, texts, text_confidences):
+        if len(image_bboxs) == len(image_texts):
+            detection_confidences = [float(bbox[4]) for bbox in image_bboxs]
+        else:
+            # craft drops zones without key points, bboxes can't be matched to texts then
+            detection_confidences = [1.0] * len(image_texts)
+        readings.append([PlateReading(text, [float(c) for c in char_confidences], detection_confidence)
+                         for text, char_confidences, detection_confidence
+                         in zip(image_texts, image_text_confidences, detection_confidences)])
+    return readings
+
+
+class RecognitionBatcher:
+    def __init__(self, number_plate_detection_and_reading, max_batch_images=MAX_BATCH_IMAGES,
+                 max_wait=MAX_BATCH_WAIT, batch_size=PIPELINE_BATCH_SIZE):
+        self.pipeline = number_plate_detection_and_reading
+        self.max_batch_images = max_batch_images
+        self.max_wait = max_wait
+        self.batch_size = batch_size
+        self._jobs = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, images):
+        future = Future()
+        images = list(images)
+        if not images:
+            future.set_result([])
+        else:
+            self._jobs.put((images, future))
+        return future
+
+    def recognize(self, images):
+        return self.submit(images).result()
+
+    def _collect_jobs(self):
+        jobs = [self._jobs.get()]
+        count_images = len(jobs[0][0])
+        deadline = time.monotonic() + self.max_wait
+        while count_images < self.max_batch_images:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                job = self._jobs.get(timeout=timeout)
+            except queue.Empty:
+                break
+            jobs.append(job)
+            count_images += len(job[0])
+        return jobs
+
+    def _run(self):
+        while True:
+            jobs = self._collect_jobs()
+            images = [image for job_images, _ in jobs for image in job_images]
+            logger.debug(f"Пакетное распознавание: объявлений {len(jobs)}, изображений {len(images)}")
+            try:
+                texts = run_recognition(self.pipeline, images, batch_size=self.batch_size)
+            except Exception as e:
+                for _, future in jobs:
+                    future.set_exception(e)
+                continue
+            registry.inc('images_recognized', len(images))
+            registry.inc('plates_recognized', sum(len(image_texts) for image_texts in texts))
+            offset = 0
+            for job_images, future in jobs:
+                future.set_result(texts[offset:offset + len(job_images)])
+                offset += len(job_images)
+
+
+def handle_connection(conn, batcher):
+    with conn:
+        while True:
+            try:
+                images = conn.recv()
+            except EOFError:
+                return
+            try:
+                texts = batcher.recognize(images)
+                logger.debug(f"Распознано изображений: {len(texts)}")
+                conn.send({'ok': True, 'texts': texts})
+            except Exception as e:
+                logger.error(f"Ошибка при распознавании номеров в воркере: {e}")
+                conn.send({'ok': False, 'error': str(e)})
+
+
+def serve(host=WORKER_HOST, port=WORKER_PORT, authkey=WORKER_AUTHKEY):
+    if not authkey:
+        logger.error("Не задан RECOGNITION_WORKER_AUTHKEY, воркер распознавания не запущен.")
+        raise SystemExit(1)
+    batcher = RecognitionBatcher(load_recognition_pipeline())
+    start_metrics_pusher()
+    logger.info(f"Воркер распознавания запущен на {host}:{port}.")
+    with Listener((host, port), authkey=authkey) as listener:
+        while True:
+            try:
+                conn = listener.accept()
+            except Exception as e:
+                logger.error(f"Ошибка соединения с воркером распознавания: {e}")
+                continue
+            threading.Thread(target=handle_connection, args=(conn, batcher), daemon=True).start()
+
+
+def submit_images(images, host=WORKER_HOST, port=WORKER_PORT, authkey=WORKER_AUTHKEY):
+    if not authkey:
+        raise ConnectionError("не задан RECOGNITION_WORKER_AUTHKEY")
+    with Client((host, port), authkey=authkey) as conn:
+        conn.send(list(images))
+        response = conn.recv()
+    if not response.get('ok'):
+        raise RuntimeError(response.get('error', 'Неизвестная ошибка воркера распознавания'))
+    return response['texts']
+
+
+if __name__ == "__main__":
+    serve()
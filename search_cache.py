@@ -0,0 +1,139 @@
+import atexit
+import os
+import threading
+import time
+from collections import OrderedDict
+import requests
+from logger import setup_logger
+from plate_search import plate_search_keys
+
+logger = setup_logger(__name__)
+
+SEARCH_CACHE_SIZE = int(os.getenv('SEARCH_CACHE_SIZE', '10000'))
+SEARCH_CACHE_TTL = float(os.getenv('SEARCH_CACHE_TTL', '3600'))
+SEARCH_CACHE_INVALIDATE_URL = os.getenv('SEARCH_CACHE_INVALIDATE_URL', 'http://localhost:8000/search-cache/invalidate')
+SEARCH_CACHE_INVALIDATE_TIMEOUT = float(os.getenv('SEARCH_CACHE_INVALIDATE_TIMEOUT', '1'))
+
+
+class SearchCache:
+    def __init__(self, max_size=SEARCH_CACHE_SIZE, ttl=SEARCH_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._tagged = {}
+        self._tags = {}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, tags=()):
+        """
+        tags are fuzzy search keys of the query, a new plate sharing one of them drops the entry
+        """
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._tags[key] = set(tags)
+            for tag in tags:
+                self._tagged.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_size:
+                self._drop(next(iter(self._entries)))
+
+    def _drop(self, key):
+        self._entries.pop(key, None)
+        for tag in self._tags.pop(key, ()):
+            self._tagged[tag].discard(key)
+            if not self._tagged[tag]:
+                del self._tagged[tag]
+
+    def invalidate_plates(self, numbers):
+        # prefix searches are cached too, so every prefix of a new plate is dropped
+        with self._lock:
+            for number in numbers:
+                for length in range(1, len(number) + 1):
+                    self._drop(number[:length])
+                for tag in plate_search_keys(number):
+                    for key in list(self._tagged.get(tag, ())):
+                        self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tagged.clear()
+            self._tags.clear()
+
+
+search_cache = SearchCache()
+
+
+class InvalidationPusher:
+    """
+    sends new plates to the bot from a background thread, so inserts never wait for its http service;
+    plates queued while a request is in flight go out together in the next one
+    """
+    def __init__(self, url=SEARCH_CACHE_INVALIDATE_URL, timeout=SEARCH_CACHE_INVALIDATE_TIMEOUT):
+        self.url = url
+        self.timeout = timeout
+        self._cond = threading.Condition()
+        self._pending = set()
+        self._sending = False
+        self._thread = None
+
+    def push(self, numbers):
+        with self._cond:
+            self._pending.update(numbers)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                numbers, self._pending = sorted(self._pending), set()
+                self._sending = True
+            try:
+                response = requests.post(self.url, json={'numbers': numbers}, timeout=self.timeout)
+                response.raise_for_status()
+            except Exception as e:
+                # entries of these plates expire by SEARCH_CACHE_TTL in the bot
+                logger.warning(f"Не удалось сбросить кэш поиска в сервисе бота: {e}")
+            with self._cond:
+                self._sending = False
+                self._cond.notify_all()
+
+    def flush(self, timeout=None):
+        timeout = self.timeout * 2 if timeout is None else timeout
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._pending and not self._sending, timeout)
+
+
+_invalidation_pusher = None
+_invalidation_pusher_lock = threading.Lock()
+
+
+def get_invalidation_pusher():
+    global _invalidation_pusher
+    with _invalidation_pusher_lock:
+        if _invalidation_pusher is None:
+            _invalidation_pusher = InvalidationPusher()
+            # main.py exits after every cycle, the last plates are sent before that
+            atexit.register(_invalidation_pusher.flush)
+    return _invalidation_pusher
+
+
+def push_search_cache_invalidation(numbers):
+    if numbers:
+        get_invalidation_pusher().push(numbers)
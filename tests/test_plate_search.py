@@ -0,0 +1,52 @@
+import asyncio
+import importlib
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from plate_search import fit_plate_layout, fold_plate, plate_distance, plate_search_keys, rank_candidates
+
+
+def test_fit_plate_layout_swaps_lookalikes_by_position():
+    assert fit_plate_layout('0123ВС77') == 'О123ВС77'
+    assert fit_plate_layout('А12ЗВС77') == 'А123ВС77'
+    assert fit_plate_layout('А123ВС77') == 'А123ВС77'
+
+
+def test_same_class_confusions_fold_together():
+    assert fold_plate('А183ВС77') == fold_plate('А103ВС77') == fold_plate('А133ВС77')
+    assert fold_plate('А123РС77') == fold_plate('А123ВС77')
+    assert plate_distance('А183ВС77', 'А103ВС77') < 1
+
+
+def test_confusable_query_reaches_similar_numbers(tmp_path, monkeypatch):
+    db_path = tmp_path / 'ads.db'
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('DATABASE_URL', f'sqlite:///{db_path}')
+    monkeypatch.setenv('ASYNC_DATABASE_URL', f'sqlite+aiosqlite:///{db_path}')
+    sys.modules.pop('db_worker', None)
+    db_worker = importlib.import_module('db_worker')
+    try:
+        db_worker.add_advertisements([{
+            'title': 'Lada Vesta',
+            'additional_info': {'Год': '2019', 'Город': 'Москва'},
+            'ad_id': '1',
+            'car_number': 'О128ВС77',
+        }])
+        query = fit_plate_layout('0123ВС77')
+        assert db_worker.normalize_plate('0123ВС77') != query
+
+        ads = asyncio.run(db_worker.search_ads_by_similar_number(query))
+        assert [ad['car_number'] for ad in ads] == ['О128ВС77']
+        assert 0 < ads[0]['match_distance'] < 1
+    finally:
+        sys.modules.pop('db_worker', None)
+
+
+def test_plates_within_cutoff_share_a_search_key():
+    query = 'А103ВС77'
+    for candidate in ('А183ВС77', 'А183РС77', 'А104ВС77', 'А103ВС777', 'А10ВС77'):
+        assert rank_candidates(query, [candidate])
+        assert plate_search_keys(query) & plate_search_keys(candidate)
+    assert not rank_candidates(query, ['А104ВЕ77'])
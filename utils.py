@@ -1,8 +1,8 @@
 import json
 import re
-import requests
 from logger import setup_logger
 from telebot.types import ReplyKeyboardMarkup, KeyboardButton
+from plate_search import fit_plate_layout
 
 
 logger = setup_logger(__name__)
@@ -43,6 +43,23 @@ def remove_user_from_json(file_path, user_name):
 def is_valid_number(number):
     return bool(re.match(r'^[АВЕКМНОРСТУХABEKMHOPCTYX]\d{3}[АВЕКМНОРСТУХABEKMHOPCTYX]{2}\d{2,3}$', number))
 
+def is_valid_number_prefix(number):
+    return bool(re.match(r'^[АВЕКМНОРСТУХABEKMHOPCTYX]\d{3}([АВЕКМНОРСТУХABEKMHOPCTYX]{1,2}\d{0,3})?$', number))
+
+def plate_query(number):
+    """
+    Returns the plate to search for a normalized query and the search kind:
+    'exact', 'prefix', 'similar' for a query that fits the layout only after
+    letter/digit lookalikes are swapped (0123ВС77), or None.
+    """
+    if is_valid_number(number):
+        return number, 'exact'
+    if is_valid_number_prefix(number):
+        return number, 'prefix'
+    if is_valid_number(fit_plate_layout(number)):
+        return fit_plate_layout(number), 'similar'
+    return number, None
+
 def create_keyboard(buttons, one_time_keyboard=True, row_width=2):
     markup = ReplyKeyboardMarkup(resize_keyboard=True, one_time_keyboard=one_time_keyboard)
     for i in range(0, len(buttons), row_width):
@@ -50,19 +67,6 @@ def create_keyboard(buttons, one_time_keyboard=True, row_width=2):
         markup.add(*row_buttons)
     return markup
 
-def get_phone_number(sale_id):
-    phone_url = f"https://autokochka.ru/ajax/sale/getPhone/?sale_id={sale_id}"
-    response = requests.get(phone_url)
-    if response.status_code == 200:
-        data = response.json()
-        if data.get("ok"):
-            return data.get("data", {}).get("phone")
-        else:
-            logger.warning(f"Не удалось получить номер телефона для объявления {sale_id}")
-    else:
-        logger.error(f"Ошибка при получении телефонного номера с кодом ответа HTTP {response.status_code}")
-    return None
-
 def format_ads_info(ads_info, is_new_ad=False, ads_count=None):
     if not ads_info:
         return "Номер не найден в базе данных."